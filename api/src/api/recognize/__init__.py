@@ -1,5 +1,12 @@
-from .service import RecognizeServiceDep
-from .schemes import Detection
+from .service import RecognizeService, RecognizeServiceDep
+from .schemes import Detection, DetectResponse, KitHints
 from .api import router as recognize_router
 
-__all__ = ["RecognizeServiceDep", "Detection", "recognize_router"]
+__all__ = [
+    "RecognizeService",
+    "RecognizeServiceDep",
+    "Detection",
+    "DetectResponse",
+    "KitHints",
+    "recognize_router",
+]
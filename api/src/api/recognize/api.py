@@ -13,7 +13,8 @@ async def recognize(
     images: list[UploadFile],
 ) -> list[DetectResponseWithImage]:
     images_bytes = [await img.read() for img in images]
-    detections = await recognize_service.recognize(images_bytes)
+    # batch uploads go to the bulk lane, sessions stay interactive
+    detections = await recognize_service.recognize(images_bytes, priority="bulk")
     images_with_boxes = [
         recognize_service.draw_boxes(image, detections[i].detections)
         for i, image in enumerate(images_bytes)
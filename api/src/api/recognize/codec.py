@@ -0,0 +1,76 @@
+import struct
+import sys
+from array import array
+
+from .schemes import Detection, DetectionBBox, DetectResponse
+
+# Compact detection reply produced by recognize/src/codec.py, requested with
+# the x-reply-format header (AMQP) or the Accept header (HTTP). All numbers
+# are little-endian:
+#   header   magic "DET1", success (bool), detections (u32), error length (u16)
+#   error    utf-8 text, "ImageRejected:<reason>" for a rejected photo
+#   names    count (u16), then per class: class id (u16), length (u8), utf-8
+#   columns  class ids u16[n], confidences f32[n], boxes f32[n * 4] (x1 y1 x2 y2)
+MAGIC = b"DET1"
+CONTENT_TYPE = "application/x-detections"
+REPLY_FORMAT = "det1"
+_HEADER = struct.Struct("<4s?IH")
+_COUNT = struct.Struct("<H")
+_NAME = struct.Struct("<HB")
+
+
+def _read_column(
+    typecode: str, data: bytes, offset: int, count: int
+) -> tuple[array, int]:
+    column = array(typecode)
+    end = offset + column.itemsize * count
+    column.frombytes(data[offset:end])
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column, end
+
+
+def decode_response(data: bytes) -> DetectResponse:
+    magic, success, count, error_length = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"Not a compact detection reply: {magic!r}")
+    offset = _HEADER.size
+    error, _, reject_reason = (
+        data[offset : offset + error_length].decode("utf-8").partition(":")
+    )
+    offset += error_length
+
+    (names_count,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    names = {}
+    for _ in range(names_count):
+        class_id, length = _NAME.unpack_from(data, offset)
+        offset += _NAME.size
+        names[class_id] = data[offset : offset + length].decode("utf-8")
+        offset += length
+
+    class_ids, offset = _read_column("H", data, offset, count)
+    confidences, offset = _read_column("f", data, offset, count)
+    boxes, offset = _read_column("f", data, offset, count * 4)
+    # the payload is produced by the recognize worker, skip pydantic validation
+    detections = [
+        Detection.model_construct(
+            class_id=class_id,
+            class_name=names[class_id],
+            confidence=confidence,
+            bbox=DetectionBBox.model_construct(
+                x1=boxes[i * 4],
+                y1=boxes[i * 4 + 1],
+                x2=boxes[i * 4 + 2],
+                y2=boxes[i * 4 + 3],
+            ),
+        )
+        for i, (class_id, confidence) in enumerate(zip(class_ids, confidences))
+    ]
+    return DetectResponse.model_construct(
+        success=success,
+        detections=detections,
+        total_detections=count,
+        error=error or None,
+        reject_reason=reject_reason or None,
+    )
@@ -1,32 +1,229 @@
 import base64
-from typing import Annotated, Protocol
+from typing import Annotated, Literal, Protocol
 from fastapi import Depends
-from faststream.rabbit import RabbitBroker
+from faststream.rabbit import RabbitBroker, RabbitQueue
 import httpx
-from .schemes import DetectResponse, DetectRequest
+from .codec import CONTENT_TYPE, MAGIC, REPLY_FORMAT, decode_response
+from .schemes import DetectResponse, DetectRequest, KitHints
 from src.core import SETTINGS, BrokerDep
+from src.storage import AsyncS3Repository, AsyncS3RepositoryDep
 import asyncio
+import json
+import time
+import uuid
+from functools import partial
+
+RPC_TIMEOUT = 30.0
+BINARY_QUEUE = RabbitQueue("detect_queue_v2", routing_key="detect.v2")
+# bulk lane: workers consume it with a smaller prefetch and serve it after the
+# interactive queues, so batch uploads do not hold up a storekeeper at the
+# counter
+BULK_QUEUE = RabbitQueue("detect_queue_v2_bulk", routing_key="detect.v2.bulk")
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"RIFF": "image/webp",
+}
+
+
+# interactive: someone is waiting for the answer; bulk: throughput matters
+Priority = Literal["interactive", "bulk"]
 
 
 class RecognizeRepositoryProtocol(Protocol):
-    async def recognize(self, images: list[bytes]) -> list[DetectResponse]: ...
+    # hints: per image, what is known about the kit on the tray; image_keys:
+    # where the images are already stored in S3, claim check sends these
+    async def recognize(
+        self,
+        images: list[bytes],
+        hints: list[KitHints | None] | None = None,
+        priority: Priority = "interactive",
+        image_keys: list[str] | None = None,
+    ) -> list[DetectResponse]: ...
+
+
+class BinaryTransportNegotiator:
+    # v2 messages carry raw image bytes and are consumed from their own queue
+    # by workers that understand them. Binary is used only while that queue
+    # has consumers, so old JSON-only workers keep working during a rollout
+    def __init__(
+        self, queue: RabbitQueue = BINARY_QUEUE, ttl_seconds: float = 30.0
+    ) -> None:
+        self._queue = queue
+        self._ttl = ttl_seconds
+        self._supported = False
+        self._checked_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    async def binary_supported(self, broker: RabbitBroker) -> bool:
+        mode = SETTINGS.recognize_transport
+        if mode != "auto":
+            return mode == "binary"
+        return await self.has_consumers(broker)
+
+    async def has_consumers(self, broker: RabbitBroker) -> bool:
+        async with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at >= self._ttl:
+                self._supported = await self._count_consumers(broker)
+                self._checked_at = now
+        return self._supported
+
+    async def _count_consumers(self, broker: RabbitBroker) -> bool:
+        try:
+            queue = await broker.declare_queue(self._queue)
+            # the declarer caches queues, redeclaring refreshes the counters
+            result = await queue.declare()
+        except Exception as e:
+            print(f"Warning: could not check {self._queue.name} consumers: {e}")
+            return False
+        return result.consumer_count > 0
+
+
+negotiator = BinaryTransportNegotiator()
+# workers that predate the lanes do not consume the bulk queue, bulk requests
+# then share the interactive one
+bulk_lane = BinaryTransportNegotiator(BULK_QUEUE)
+
+
+def _reply_headers() -> dict[str, str]:
+    if SETTINGS.recognize_reply_format == REPLY_FORMAT:
+        return {"x-reply-format": REPLY_FORMAT}
+    return {}
+
+
+def _request_headers() -> dict[str, str | float]:
+    now = time.time()
+    return {
+        # workers time the queue wait from this and skip requests whose
+        # deadline passed, nobody waits for their reply any more
+        "x-published-at": now,
+        "x-deadline": now + RPC_TIMEOUT,
+        **_reply_headers(),
+    }
+
+
+def _hint_fields(
+    hints: KitHints, prefix: str = "", separator: str = "_"
+) -> dict[str, str]:
+    # JSON encoded form fields, or x-expected-counts style headers
+    return {
+        prefix + field.replace("_", separator): json.dumps(value)
+        for field, value in hints.model_dump(exclude_none=True).items()
+    }
+
+
+def _parse_reply(result) -> DetectResponse:
+    # workers that predate the compact format ignore the header and keep
+    # replying with JSON, so the body decides how it is parsed
+    if isinstance(result, bytes) and result.startswith(MAGIC):
+        return decode_response(result)
+    return DetectResponse.model_validate(result)
+
+
+def _content_type(image: bytes) -> str:
+    for magic, content_type in IMAGE_SIGNATURES.items():
+        if image.startswith(magic):
+            return content_type
+    return "application/octet-stream"
 
 
 class RecognizeRepositoryAmqp(RecognizeRepositoryProtocol):
-    def __init__(self, broker: RabbitBroker) -> None:
+    def __init__(
+        self, broker: RabbitBroker, storage: AsyncS3Repository | None = None
+    ) -> None:
         self._broker = broker
+        self._storage = storage
+
+    def _publish_json(
+        self, image: bytes, hints: KitHints | None, image_key: str | None = None
+    ):
+        encoded = "" if image_key else base64.b64encode(image).decode("utf-8")
+        return self._broker.publish(
+            DetectRequest(
+                image_bytes=encoded,
+                image_key=image_key,
+                **(hints.model_dump() if hints else {}),
+            ),
+            queue="detect_queue",
+            rpc=True,
+            rpc_timeout=RPC_TIMEOUT,
+            # the broker discards it unconsumed once the caller has given up
+            expiration=RPC_TIMEOUT,
+            headers=_request_headers(),
+        )
 
-    async def recognize(self, images: list[bytes]) -> list[DetectResponse]:
-        tasks = [
-            self._broker.publish(
-                DetectRequest(image_bytes=base64.b64encode(image).decode("utf-8")),
-                queue="detect_queue",
-                rpc=True,
+    def _publish_binary(
+        self,
+        image: bytes,
+        hints: KitHints | None,
+        queue: RabbitQueue = BINARY_QUEUE,
+        image_key: str | None = None,
+    ):
+        headers = {"x-request-id": uuid.uuid4().hex, **_request_headers()}
+        if hints is not None:
+            headers.update(_hint_fields(hints, "x-", "-"))
+        if image_key is not None:
+            headers["x-image-key"] = image_key
+        return self._broker.publish(
+            b"" if image_key is not None else image,
+            queue=queue.name,
+            rpc=True,
+            rpc_timeout=RPC_TIMEOUT,
+            expiration=RPC_TIMEOUT,
+            content_type=_content_type(image),
+            headers=headers,
+        )
+
+    async def recognize(
+        self,
+        images: list[bytes],
+        hints: list[KitHints | None] | None = None,
+        priority: Priority = "interactive",
+        image_keys: list[str] | None = None,
+    ) -> list[DetectResponse]:
+        if not await negotiator.binary_supported(self._broker):
+            publish = self._publish_json
+        elif priority == "bulk" and await bulk_lane.has_consumers(self._broker):
+            publish = partial(self._publish_binary, queue=BULK_QUEUE)
+        else:
+            publish = self._publish_binary
+        hints = hints or [None] * len(images)
+        if not SETTINGS.recognize_claim_check or self._storage is None:
+            results = await asyncio.gather(
+                *[publish(image, hint) for image, hint in zip(images, hints)]
             )
-            for image in images
-        ]
-        results = await asyncio.gather(*tasks)
-        return [DetectResponse.model_validate(result) for result in results]
+            return [_parse_reply(result) for result in results]
+
+        # images the caller already stored, e.g. a session photo under its own
+        # key, are read from there; the rest get a temporary object
+        temporary = []
+        if image_keys is None:
+            temporary = image_keys = await asyncio.gather(
+                *[
+                    self._storage.upload_file(
+                        key=f"{SETTINGS.recognize_claim_check_prefix}{uuid.uuid4().hex}",
+                        data=image,
+                        content_type=_content_type(image),
+                    )
+                    for image in images
+                ]
+            )
+        try:
+            results = await asyncio.gather(
+                *[
+                    publish(image, hint, image_key=key)
+                    for image, hint, key in zip(images, hints, image_keys)
+                ]
+            )
+        finally:
+            # read by the worker by now, or the deadline has passed and the
+            # worker drops the message before fetching it
+            await asyncio.gather(
+                *[self._storage.delete_file(key=key) for key in temporary],
+                return_exceptions=True,
+            )
+        return [_parse_reply(result) for result in results]
 
 
 class RecognizeRepositoryHttp(RecognizeRepositoryProtocol):
@@ -34,21 +231,83 @@ class RecognizeRepositoryHttp(RecognizeRepositoryProtocol):
         self.api_url = SETTINGS.recognize_api_url
         self.api_key = SETTINGS.recognize_api_key
 
-    async def recognize(self, images: list[bytes]) -> list[DetectResponse]:
+    async def recognize(
+        self,
+        images: list[bytes],
+        hints: list[KitHints | None] | None = None,
+        priority: Priority = "interactive",
+        image_keys: list[str] | None = None,
+    ) -> list[DetectResponse]:
+        # the HTTP recognizer has no lanes or storage access, priority and
+        # image_keys only apply to amqp
         headers = {"Authorization": f"Bearer {self.api_key}"}
-        results = []
+        hints = hints or [None] * len(images)
         async with httpx.AsyncClient() as client:
-            for image in images:
+            if len(images) > 1:
+                # one chunk after another, concurrent chunks would only be
+                # turned away by the service's admission limit
+                results = []
+                limit = SETTINGS.recognize_batch_limit
+                for start in range(0, len(images), limit):
+                    results.extend(
+                        await self._recognize_batch(
+                            client,
+                            headers,
+                            images[start : start + limit],
+                            hints[start : start + limit],
+                        )
+                    )
+                return results
+
+            if SETTINGS.recognize_reply_format == REPLY_FORMAT:
+                headers["Accept"] = CONTENT_TYPE
+            results = []
+            for image, hint in zip(images, hints):
                 files = {"file": ("image.jpg", image, "image/jpeg")}
-                response = await client.post(self.api_url, headers=headers, files=files)
+                data = _hint_fields(hint) if hint is not None else None
+                response = await client.post(
+                    self.api_url, headers=headers, files=files, data=data
+                )
                 response.raise_for_status()
-                results.append(DetectResponse(**response.json()))
-        return results
+                if response.headers.get("content-type") == CONTENT_TYPE:
+                    results.append(decode_response(response.content))
+                else:
+                    results.append(DetectResponse(**response.json()))
+            return results
+
+    async def _recognize_batch(
+        self,
+        client: httpx.AsyncClient,
+        headers: dict[str, str],
+        images: list[bytes],
+        hints: list[KitHints | None],
+    ) -> list[DetectResponse]:
+        # one request and one batched forward pass, results in input order
+        files = [
+            ("files", (f"image{i}.jpg", image, "image/jpeg"))
+            for i, image in enumerate(images)
+        ]
+        response = await client.post(
+            f"{self.api_url}/batch",
+            headers=headers,
+            files=files,
+            data={
+                field: json.dumps(
+                    [getattr(hint, field) if hint else None for hint in hints]
+                )
+                for field in KitHints.model_fields
+            },
+            timeout=RPC_TIMEOUT,
+        )
+        response.raise_for_status()
+        return [DetectResponse.model_validate(result) for result in response.json()]
 
 
-def get_recognize_repository(broker: BrokerDep) -> RecognizeRepositoryProtocol:
+def get_recognize_repository(
+    broker: BrokerDep, storage: AsyncS3RepositoryDep
+) -> RecognizeRepositoryProtocol:
     if SETTINGS.recognize_app_mode == "amqp":
-        return RecognizeRepositoryAmqp(broker)
+        return RecognizeRepositoryAmqp(broker, storage)
     else:
         return RecognizeRepositoryHttp()
 
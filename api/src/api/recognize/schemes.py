@@ -19,10 +19,23 @@ class DetectResponse(BaseModel):
     success: bool = True
     detections: list[Detection]
     total_detections: int
+    error: str | None = None
+    # with error ImageRejected: low_resolution, underexposed, overexposed or
+    # blurry, the photo has to be retaken
+    reject_reason: str | None = None
 
 
-class DetectRequest(BaseModel):
-    image_bytes: str
+class KitHints(BaseModel):
+    # model class id -> quantity in the kit on the tray, if known
+    expected_counts: dict[int, int] | None = None
+    # model class ids that can be on the tray, the recognizer prunes the rest
+    allowed_classes: list[int] | None = None
+
+
+class DetectRequest(KitHints):
+    # base64 photo, or empty when image_key names it in the S3 bucket
+    image_bytes: str = ""
+    image_key: str | None = None
 
 
 class DetectResponseWithImage(DetectResponse):
@@ -3,8 +3,12 @@ from typing import Annotated
 from fastapi import Depends
 
 
-from .repository import RecognizeRepositoryDep, RecognizeRepositoryProtocol
-from .schemes import DetectResponse, Detection, DetectionBBox
+from .repository import (
+    Priority,
+    RecognizeRepositoryDep,
+    RecognizeRepositoryProtocol,
+)
+from .schemes import DetectResponse, Detection, DetectionBBox, KitHints
 from PIL import Image
 from PIL import ImageDraw
 from PIL import ImageFont
@@ -36,8 +40,14 @@ class RecognizeService:
     def __init__(self, repository: RecognizeRepositoryProtocol):
         self._repository = repository
 
-    async def recognize(self, images: list[bytes]) -> list[DetectResponse]:
-        return await self._repository.recognize(images)
+    async def recognize(
+        self,
+        images: list[bytes],
+        hints: list[KitHints | None] | None = None,
+        priority: Priority = "interactive",
+        image_keys: list[str] | None = None,
+    ) -> list[DetectResponse]:
+        return await self._repository.recognize(images, hints, priority, image_keys)
 
     def draw_boxes(self, image: bytes, detections: list[Detection]) -> bytes:
         img = Image.open(BytesIO(image)).convert("RGB")
@@ -1,7 +1,12 @@
 from typing import Annotated
 from fastapi import APIRouter, File, Form, HTTPException, UploadFile
 
-from src.api.recognize import RecognizeServiceDep
+from src.api.recognize import (
+    DetectResponse,
+    KitHints,
+    RecognizeService,
+    RecognizeServiceDep,
+)
 
 from .schemes import (
     SessionCreateDto,
@@ -9,13 +14,51 @@ from .schemes import (
     SessionPageResponse,
     SessionDetailsResponse,
 )
-from .service import SessionServiceDep
+from .service import SessionService, SessionServiceDep
 from src.core import ID_TYPE
 from src.core import PageRequestDep
 
 router = APIRouter(prefix="/session", tags=["session"])
 
 
+def _ensure_recognized(result: DetectResponse) -> None:
+    if result.reject_reason:
+        # the photo itself is unusable: retaking it helps, retrying does not
+        raise HTTPException(
+            status_code=422,
+            detail=f"Photo rejected as {result.reject_reason.replace('_', ' ')}, "
+            "retake it",
+        )
+    if not result.success:
+        raise HTTPException(
+            status_code=500,
+            detail="Recognition service error, try again in a few minutes",
+        )
+
+
+async def _recognize_photo(
+    service: SessionService,
+    recognize_service: RecognizeService,
+    image_data: bytes,
+    hints: KitHints,
+) -> tuple[DetectResponse, str | None]:
+    image_key = await service.upload_photo(image_data)
+    try:
+        result = (
+            await recognize_service.recognize(
+                [image_data],
+                [hints],
+                image_keys=[image_key] if image_key is not None else None,
+            )
+        )[0]
+        _ensure_recognized(result)
+    except Exception:
+        # no session refers to the photo
+        await service.discard_photo(image_key)
+        raise
+    return result, image_key
+
+
 @router.get("/", response_model=SessionPageResponse)
 async def list_sessions(
     service: SessionServiceDep,
@@ -48,12 +91,10 @@ async def initialize_session(
         kit_id=kit_id,
     )
     image_data = await image.read()
-    tools_recognized = (await recognize_service.recognize([image_data]))[0]
-    if not tools_recognized.success:
-        raise HTTPException(
-            status_code=500,
-            detail="Recognition service error, try again in a few minutes",
-        )
+    hints = await service.kit_hints(kit_id=kit_id)
+    tools_recognized, image_key = await _recognize_photo(
+        service, recognize_service, image_data, hints
+    )
     image_drawn_boxes = recognize_service.draw_boxes(
         image_data, tools_recognized.detections
     )
@@ -61,6 +102,7 @@ async def initialize_session(
         session_data=session_data,
         image_recognized=image_drawn_boxes,
         detections=tools_recognized.detections,
+        image_key=image_key,
     )
 
 
@@ -80,12 +122,10 @@ async def preclose_session(
     image: Annotated[UploadFile, File()],
 ):
     image_data = await image.read()
-    tools_recognized = (await recognize_service.recognize([image_data]))[0]
-    if not tools_recognized.success:
-        raise HTTPException(
-            status_code=500,
-            detail="Recognition service error, try again in a few minutes",
-        )
+    hints = await service.kit_hints(session_id=session_id)
+    tools_recognized, image_key = await _recognize_photo(
+        service, recognize_service, image_data, hints
+    )
 
     image_drawn_boxes = recognize_service.draw_boxes(
         image_data, tools_recognized.detections
@@ -95,6 +135,7 @@ async def preclose_session(
         session_id=session_id,
         image_recognized=image_drawn_boxes,
         detections=tools_recognized.detections,
+        image_key=image_key,
     )
 
 
@@ -41,6 +41,13 @@ class SessionRepository(AsyncRepository[Session]):
         result = await self.session.execute(stmt)
         return result.all()
 
+    async def kit_composition(self, kit_id: ID_TYPE) -> dict[ID_TYPE, int]:
+        stmt = select(ToolInKit.tool_id, ToolInKit.quantity).where(
+            ToolInKit.kit_id == kit_id
+        )
+        result = await self.session.execute(stmt)
+        return {tool_id: quantity for tool_id, quantity in result.all()}
+
     async def open_session(self, session_id: ID_TYPE):
         await self.update(session_id, {"status": SessionStatus.opened})
 
@@ -2,7 +2,7 @@ from collections import Counter
 from typing import Annotated
 import uuid
 from fastapi import Depends, HTTPException
-from src.api.recognize import Detection
+from src.api.recognize import Detection, KitHints
 from src.storage import AsyncS3Repository, AsyncS3RepositoryDep
 from src.database import Session, SessionStatus, SessionTool
 from src.api.session_tool.repository import (
@@ -75,6 +75,41 @@ class SessionService:
         result.tools = session_tools_info
         return result
 
+    async def kit_hints(
+        self, *, kit_id: ID_TYPE | None = None, session_id: ID_TYPE | None = None
+    ) -> KitHints:
+        # kit composition in model class ids, lets the recognizer check its
+        # counts against what should be on the tray and skip every other class
+        if kit_id is None:
+            kit_id = (await self._get_session(session_id)).kit_id  # type: ignore
+        composition = await self._session_repository.kit_composition(kit_id)
+        class_ids = {
+            tool_id: class_id for class_id, tool_id in SETTINGS.tools_mapping.items()
+        }
+        expected_counts = {
+            class_ids[tool_id]: quantity
+            for tool_id, quantity in composition.items()
+            if tool_id in class_ids
+        }
+        # a kit none of whose tools the model knows is not restricted, an
+        # empty count would read as "the tray must be empty"
+        return KitHints(
+            expected_counts=expected_counts or None,
+            allowed_classes=sorted(expected_counts) or None,
+        )
+
+    async def upload_photo(self, image: bytes) -> str | None:
+        # claim check: the photo is stored once under the key the session
+        # keeps and the recognizer reads it from there, the annotated photo
+        # replaces it once recognized
+        if not SETTINGS.recognize_claim_check:
+            return None
+        return await self._s3_repository.upload_file(key=str(uuid.uuid4()), data=image)
+
+    async def discard_photo(self, image_key: str | None) -> None:
+        if image_key is not None:
+            await self._s3_repository.delete_file(key=image_key)
+
     def _map_detetctions_to_tools(
         self, detections: list[Detection]
     ) -> dict[ID_TYPE, int]:
@@ -89,6 +124,7 @@ class SessionService:
         session_data: SessionCreateDto,
         image_recognized: bytes,
         detections: list[Detection],
+        image_key: str | None = None,
     ) -> SessionDetailsResponse:
         tools_recognized = self._map_detetctions_to_tools(detections)
         data = session_data.model_dump()
@@ -105,7 +141,7 @@ class SessionService:
         ]
         await self._session_tool_repository.create_many(session_tools)
         image_url = await self._s3_repository.upload_file(
-            key=str(uuid.uuid4()), data=image_recognized
+            key=image_key or str(uuid.uuid4()), data=image_recognized
         )
         session = await self._session_repository.update(
             session.id,
@@ -124,6 +160,7 @@ class SessionService:
         session_id: ID_TYPE,
         image_recognized: bytes,
         detections: list[Detection],
+        image_key: str | None = None,
     ) -> SessionDetailsResponse:
         session = await self._get_session(session_id)
         tools_recognized = self._map_detetctions_to_tools(detections)
@@ -138,7 +175,7 @@ class SessionService:
             await self._session_tool_repository.update_many(updates)
 
         image_url = await self._s3_repository.upload_file(
-            key=str(uuid.uuid4()), data=image_recognized
+            key=image_key or str(uuid.uuid4()), data=image_recognized
         )
         await self._session_repository.update(
             session.id,
@@ -46,6 +46,19 @@ class Settings(BaseSettings):
     recognize_api_url: str = "http://recognize:8000/detect"
     recognize_api_key: str = "some_secret_key"
     recognize_app_mode: str = "amqp"
+    # json (v1), binary (v2) or auto: binary once v2 workers are consuming
+    recognize_transport: str = "auto"
+    # json or det1: compact columnar detections, decoded without validation
+    recognize_reply_format: str = "json"
+    # images per /detect/batch request, at most the recognize service's
+    # RECOGNIZE_INFERENCE_QUEUE_SIZE or it answers 413
+    recognize_batch_limit: int = 32
+    # claim check: upload photos to S3 and send workers only the key, keeps
+    # large payloads out of the broker; workers need the s3 extra installed
+    recognize_claim_check: bool = False
+    # temporary objects of /recognize images, session photos are sent by the
+    # key the session keeps
+    recognize_claim_check_prefix: str = "recognize/"
 
     tools_mapping_str: str = '{"1":1}'
 
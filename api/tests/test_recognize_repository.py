@@ -0,0 +1,149 @@
+import asyncio
+import base64
+import re
+from types import SimpleNamespace
+
+import httpx
+
+from src.api.recognize import KitHints, repository
+from src.api.recognize.repository import (
+    BULK_QUEUE,
+    BinaryTransportNegotiator,
+    RecognizeRepositoryHttp,
+)
+from src.core import SETTINGS
+
+
+def test_http_batch_is_split_to_the_service_limit(monkeypatch):
+    batches = []
+
+    def detect_batch(request: httpx.Request) -> httpx.Response:
+        images = [int(i) for i in re.findall(rb"image-(\d+)", request.content)]
+        if len(images) > SETTINGS.recognize_batch_limit:
+            return httpx.Response(413, json={"detail": "Too many images"})
+        batches.append(len(images))
+        return httpx.Response(
+            200,
+            json=[
+                {"success": True, "detections": [], "total_detections": i}
+                for i in images
+            ],
+        )
+
+    client = httpx.AsyncClient
+    transport = httpx.MockTransport(detect_batch)
+    monkeypatch.setattr(
+        repository.httpx, "AsyncClient", lambda: client(transport=transport)
+    )
+    images = [f"image-{i}".encode() for i in range(70)]
+
+    results = asyncio.run(RecognizeRepositoryHttp().recognize(images))
+
+    assert batches == [32, 32, 6]
+    assert [result.total_detections for result in results] == list(range(70))
+
+
+def test_claim_check_reuses_stored_keys_and_cleans_up_temporary_ones(monkeypatch):
+    calls = []
+
+    class Storage:
+        async def upload_file(self, *, key, data, content_type=None):
+            calls.append(("upload", key))
+            return key
+
+        async def delete_file(self, *, key):
+            calls.append(("delete", key))
+
+    async def publish(image, hint, image_key=None):
+        calls.append(("publish", image_key))
+        return {"success": True, "detections": [], "total_detections": 0}
+
+    async def json_only(broker):
+        return False
+
+    monkeypatch.setattr(SETTINGS, "recognize_claim_check", True)
+    monkeypatch.setattr(repository.negotiator, "binary_supported", json_only)
+    amqp = repository.RecognizeRepositoryAmqp(None, Storage())
+    monkeypatch.setattr(amqp, "_publish_json", publish)
+
+    asyncio.run(amqp.recognize([b"photo"], image_keys=["session-photo"]))
+    assert calls == [("publish", "session-photo")]
+
+    calls.clear()
+    asyncio.run(amqp.recognize([b"photo"]))
+    (_, key), *_ = calls
+    assert key.startswith(SETTINGS.recognize_claim_check_prefix)
+    assert calls == [("upload", key), ("publish", key), ("delete", key)]
+
+
+class Broker:
+    # answers queue declarations with the given consumer counts and every
+    # published request with an empty detection
+    def __init__(self, consumers: dict[str, int]) -> None:
+        self.consumers = consumers
+        self.published = []
+
+    async def declare_queue(self, queue):
+        consumers = self.consumers
+
+        class Declared:
+            async def declare(self):
+                return SimpleNamespace(consumer_count=consumers.get(queue.name, 0))
+
+        return Declared()
+
+    async def publish(self, message, *, queue, headers, **kwargs):
+        self.published.append((queue, message, headers))
+        return {"success": True, "detections": [], "total_detections": 0}
+
+
+def test_negotiator_uses_binary_only_while_v2_has_consumers(monkeypatch):
+    monkeypatch.setattr(SETTINGS, "recognize_transport", "auto")
+    broker = Broker({})
+    negotiator = BinaryTransportNegotiator(ttl_seconds=0)
+
+    assert not asyncio.run(negotiator.binary_supported(broker))
+    broker.consumers["detect_queue_v2"] = 1
+    assert asyncio.run(negotiator.binary_supported(broker))
+    broker.consumers["detect_queue_v2"] = 0
+    assert not asyncio.run(negotiator.binary_supported(broker))
+
+    cached = BinaryTransportNegotiator(ttl_seconds=60)
+    assert not asyncio.run(cached.binary_supported(broker))
+    broker.consumers["detect_queue_v2"] = 1
+    assert not asyncio.run(cached.binary_supported(broker))
+
+    monkeypatch.setattr(SETTINGS, "recognize_transport", "json")
+    assert not asyncio.run(negotiator.binary_supported(broker))
+
+
+def test_amqp_publishes_binary_to_v2_workers_and_json_to_old_ones(monkeypatch):
+    monkeypatch.setattr(SETTINGS, "recognize_transport", "auto")
+    monkeypatch.setattr(SETTINGS, "recognize_claim_check", False)
+    hints = KitHints(expected_counts={3: 1})
+
+    def recognize(consumers: dict[str, int], priority="interactive"):
+        monkeypatch.setattr(repository, "negotiator", BinaryTransportNegotiator())
+        monkeypatch.setattr(
+            repository, "bulk_lane", BinaryTransportNegotiator(BULK_QUEUE)
+        )
+        broker = Broker(consumers)
+        amqp = repository.RecognizeRepositoryAmqp(broker)  # type: ignore
+        asyncio.run(amqp.recognize([b"\xff\xd8\xffphoto"], [hints], priority))
+        return broker.published
+
+    ((queue, message, headers),) = recognize({})
+    assert queue == "detect_queue"
+    assert base64.b64decode(message.image_bytes) == b"\xff\xd8\xffphoto"
+    assert message.expected_counts == {3: 1}
+
+    ((queue, message, headers),) = recognize({"detect_queue_v2": 1})
+    assert queue == "detect_queue_v2"
+    assert message == b"\xff\xd8\xffphoto"
+    assert headers["x-expected-counts"] == '{"3": 1}'
+
+    ((queue, _, _),) = recognize({"detect_queue_v2": 1}, "bulk")
+    assert queue == "detect_queue_v2"
+    consumers = {"detect_queue_v2": 1, "detect_queue_v2_bulk": 1}
+    ((queue, _, _),) = recognize(consumers, "bulk")
+    assert queue == "detect_queue_v2_bulk"
@@ -0,0 +1,32 @@
+import asyncio
+
+from src.api.session.service import SessionService
+from src.core import SETTINGS
+
+
+class KitRepository:
+    def __init__(self, composition: dict[int, int]) -> None:
+        self._composition = composition
+
+    async def kit_composition(self, kit_id):
+        return self._composition
+
+
+def _kit_hints(monkeypatch, composition: dict[int, int]):
+    monkeypatch.setattr(SETTINGS, "tools_mapping_str", '{"0": 10, "1": 11}')
+    service = SessionService(KitRepository(composition), None, None)  # type: ignore
+    return asyncio.run(service.kit_hints(kit_id=1))
+
+
+def test_kit_hints_are_in_model_class_ids(monkeypatch):
+    hints = _kit_hints(monkeypatch, {10: 2, 11: 1, 99: 1})
+
+    assert hints.expected_counts == {0: 2, 1: 1}
+    assert hints.allowed_classes == [0, 1]
+
+
+def test_unmapped_kit_sends_no_hints(monkeypatch):
+    hints = _kit_hints(monkeypatch, {98: 1, 99: 3})
+
+    assert hints.expected_counts is None
+    assert hints.allowed_classes is None
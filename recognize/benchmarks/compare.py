@@ -0,0 +1,76 @@
+import argparse
+import json
+import sys
+
+# metrics where a higher value is the better one, the rest are latencies
+HIGHER_IS_BETTER = ("images_per_s",)
+
+
+def _flatten(report: dict) -> dict[str, float]:
+    values = {}
+    for scenario, stages in report["stages"].items():
+        for metric, value in stages.items():
+            if metric.endswith("_ms"):
+                values[f"stages/{scenario}/{metric}"] = value
+    for run in report["end_to_end"]:
+        key = f"end_to_end/batch{run['batch_size']}/conc{run['concurrency']}"
+        for metric, value in run.items():
+            if metric.endswith("_ms") or metric in HIGHER_IS_BETTER:
+                values[f"{key}/{metric}"] = value
+    return values
+
+
+def compare(base: dict, new: dict, threshold: float) -> list[tuple[str, float]]:
+    # (key, relative change) of everything that got worse by more than threshold
+    base_values, new_values = _flatten(base), _flatten(new)
+    regressions = []
+    print(f"{'metric':<52}{'base':>10}{'new':>10}{'change':>9}")
+    for key in sorted(base_values.keys() & new_values.keys()):
+        old, value = base_values[key], new_values[key]
+        if not old:
+            continue
+        change = value / old - 1
+        worse = -change if key.rsplit("/", 1)[1] in HIGHER_IS_BETTER else change
+        marker = " !" if worse > threshold else ""
+        print(f"{key:<52}{old:>10.2f}{value:>10.2f}{change:>+9.1%}{marker}")
+        if worse > threshold:
+            regressions.append((key, change))
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.compare",
+        description="Compare two benchmarks.inference results and fail when "
+        "a latency or throughput got worse by more than the threshold.",
+    )
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative change that counts as a regression (default: 0.1)",
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    for field in ("backend", "precision", "imgsz", "cpus"):
+        if base["meta"].get(field) != new["meta"].get(field):
+            print(
+                f"Warning: {field} differs: {base['meta'].get(field)} "
+                f"vs {new['meta'].get(field)}"
+            )
+    regressions = compare(base, new, args.threshold)
+    print(
+        f"{base['meta'].get('commit')} -> {new['meta'].get('commit')}: "
+        f"{len(regressions)} regressions over {args.threshold:.0%}"
+    )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import argparse
+import io
+import time
+
+from PIL import Image
+
+from src.backends import IMGSZ
+from src.executor import decode_image
+
+from .images import SIZES_MP, sample_jpegs, synthetic_jpeg
+
+
+def _time_decode(data: bytes, repeats: int, **kwargs) -> tuple[float, tuple[int, int]]:
+    image, _ = decode_image(data, **kwargs)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        decode_image(data, **kwargs)
+    return (time.perf_counter() - start) / repeats * 1000, image.size
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.decode",
+        description="Decode time per image size: full resolution vs JPEG draft mode.",
+    )
+    parser.add_argument("--sizes", type=float, nargs="+", default=SIZES_MP)
+    parser.add_argument("--images", help="time these JPEGs instead of synthetic ones")
+    parser.add_argument("--target", type=int, default=IMGSZ)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--turbojpeg", action="store_true")
+    args = parser.parse_args(argv)
+
+    modes = {
+        "full": {"target": 0, "decoder": "pil"},
+        "draft": {"target": args.target, "decoder": "pil"},
+    }
+    if args.turbojpeg:
+        modes["turbojpeg"] = {"target": args.target, "decoder": "turbojpeg"}
+
+    if args.images:
+        samples = sample_jpegs(args.images)
+    else:
+        samples = [synthetic_jpeg(megapixels) for megapixels in args.sizes]
+
+    print(f"{'MP':>6}{'KB':>8}" + "".join(f"{mode:>22}" for mode in modes))
+    for data in samples:
+        width, height = Image.open(io.BytesIO(data)).size
+        row = f"{width * height / 1e6:>6.1f}{len(data) // 1024:>8}"
+        for kwargs in modes.values():
+            ms, (width, height) = _time_decode(data, args.repeats, **kwargs)
+            row += f"{f'{ms:.1f} ms ({width}x{height})':>22}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
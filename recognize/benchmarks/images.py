@@ -0,0 +1,50 @@
+import io
+import math
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# megapixels of typical phone photos, 4:3
+SIZES_MP = (1, 3, 6, 12, 24)
+
+
+def synthetic_jpeg(
+    megapixels: float, objects: int = 0, quality: int = 90, seed: int = 0
+) -> bytes:
+    height = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    width = height * 4 // 3
+    # smooth gradients with noise compress like photos, not like flat colour
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    pixels = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    pixels += rng.normal(0, 4, pixels.shape).astype(np.float32)
+    image = Image.fromarray(pixels.clip(0, 255).astype(np.uint8))
+
+    # elongated, rotated bars stand in for tools on a tray: they give the
+    # detector candidates, so post-processing scales with the density
+    draw = ImageDraw.Draw(image)
+    for _ in range(objects):
+        length = rng.uniform(0.1, 0.35) * width
+        thickness = rng.uniform(0.02, 0.05) * width
+        cx, cy = rng.uniform(0.1, 0.9) * width, rng.uniform(0.1, 0.9) * height
+        angle = rng.uniform(0, math.pi)
+        dx, dy = math.cos(angle), math.sin(angle)
+        corners = [
+            (
+                cx + along * length / 2 * dx - across * thickness / 2 * dy,
+                cy + along * length / 2 * dy + across * thickness / 2 * dx,
+            )
+            for along, across in ((-1, -1), (1, -1), (1, 1), (-1, 1))
+        ]
+        draw.polygon(corners, fill=tuple(int(c) for c in rng.integers(0, 255, 3)))
+
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def sample_jpegs(directory: str) -> list[bytes]:
+    paths = sorted(Path(directory).glob("*.jp*g"), key=lambda path: path.stat().st_size)
+    return [path.read_bytes() for path in paths]
@@ -0,0 +1,221 @@
+import os
+
+# CPU numbers only: results have to be comparable between machines with and
+# without a GPU, and torch must not see one before it is imported
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+from datetime import UTC, datetime
+
+import numpy as np
+
+from src import model as model_module
+from src.backends import (
+    IMGSZ,
+    IOU_THRESHOLD,
+    MAX_DETECTIONS,
+    TorchBackend,
+    letterbox,
+    postprocess,
+    to_input_tensor,
+)
+from src.batching import MicroBatcher
+from src.executor import DECODE_SIZE, InferenceExecutor, decode_image
+from src.model import THRESHOLD, load_model, rescale_detections
+
+from .images import sample_jpegs, synthetic_jpeg
+
+SIZES_MP = (1, 3, 12)
+DENSITIES = (0, 5, 20)
+STAGES = ("decode", "preprocess", "forward", "postprocess")
+
+
+def _percentiles(latencies: list[float]) -> dict[str, float]:
+    values = np.array(latencies) * 1000
+    return {
+        f"p{q}_ms": float(np.percentile(values, q)) if len(values) else 0.0
+        for q in (50, 95, 99)
+    }
+
+
+def _stages_numpy(backend, image) -> tuple[dict[str, float], int]:
+    start = time.perf_counter()
+    canvas, ratio, pad = letterbox(image, IMGSZ)
+    batch = to_input_tensor([canvas])
+    if backend._batch_size:
+        batch = np.repeat(batch, backend._batch_size, axis=0)
+    preprocessed = time.perf_counter()
+    output = backend._infer(batch)[0]
+    forwarded = time.perf_counter()
+    data = postprocess(output, THRESHOLD, ratio, pad, image.size)
+    done = time.perf_counter()
+    return {
+        "preprocess": preprocessed - start,
+        "forward": forwarded - preprocessed,
+        "postprocess": done - forwarded,
+    }, len(data)
+
+
+def _stages_torch(backend, image) -> tuple[dict[str, float], int]:
+    # ultralytics times its own stages, in ms per image
+    (result,) = backend._thread_model()(
+        [image],
+        conf=THRESHOLD,
+        iou=IOU_THRESHOLD,
+        imgsz=IMGSZ,
+        max_det=MAX_DETECTIONS,
+        verbose=False,
+    )
+    return {
+        "preprocess": result.speed["preprocess"] / 1000,
+        "forward": result.speed["inference"] / 1000,
+        "postprocess": result.speed["postprocess"] / 1000,
+    }, len(result.boxes)
+
+
+def measure_stages(data: bytes, repeats: int) -> dict:
+    backend = model_module.active.backend
+    stages_of = _stages_torch if isinstance(backend, TorchBackend) else _stages_numpy
+    image, _ = decode_image(data, DECODE_SIZE)
+    stages_of(backend, image)
+    timings: dict[str, list[float]] = {stage: [] for stage in STAGES}
+    detections = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        image, _ = decode_image(data, DECODE_SIZE)
+        timings["decode"].append(time.perf_counter() - start)
+        stages, detections = stages_of(backend, image)
+        for stage, seconds in stages.items():
+            timings[stage].append(seconds)
+    return {
+        "detections": detections,
+        **{f"{stage}_ms": float(np.mean(timings[stage]) * 1000) for stage in STAGES},
+    }
+
+
+async def measure_end_to_end(
+    samples: list[bytes], batch_size: int, concurrency: int, requests: int
+) -> dict:
+    # the service path: decode pool, micro-batcher, inference thread
+    executor = InferenceExecutor(queue_size=max(concurrency, batch_size) * 2)
+    batcher = MicroBatcher(max_batch_size=batch_size, executor=executor)
+    latencies: list[float] = []
+
+    async def detect(data: bytes) -> None:
+        async with executor.admit():
+            image, scale = await executor.decode(data)
+            rescale_detections(await batcher.submit(image), scale)
+
+    async def client(index: int) -> None:
+        for n in range(index, requests, concurrency):
+            start = time.perf_counter()
+            await detect(samples[n % len(samples)])
+            latencies.append(time.perf_counter() - start)
+
+    # warms up the pools before the clock starts
+    await detect(samples[0])
+    start = time.perf_counter()
+    await asyncio.gather(*[client(index) for index in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    await batcher.stop()
+    executor.shutdown()
+    return {"images_per_s": len(latencies) / elapsed, **_percentiles(latencies)}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.inference",
+        description="CPU benchmark of the recognize path: per stage times per "
+        "image size and object density, end-to-end latency and throughput per "
+        "batch size and concurrency. Compare results with benchmarks.compare.",
+    )
+    parser.add_argument("--sizes", type=float, nargs="+", default=SIZES_MP)
+    parser.add_argument("--densities", type=int, nargs="+", default=DENSITIES)
+    parser.add_argument("--images", help="directory of sample JPEGs to add")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    load_model()
+    scenarios = {
+        f"{megapixels:g}mp_{objects}obj": synthetic_jpeg(megapixels, objects)
+        for megapixels in args.sizes
+        for objects in args.densities
+    }
+    if args.images:
+        for index, data in enumerate(sample_jpegs(args.images)):
+            scenarios[f"sample_{index}"] = data
+
+    stages = {}
+    print(f"{'scenario':<16}{'det':>5}" + "".join(f"{s + ' ms':>15}" for s in STAGES))
+    for name, data in scenarios.items():
+        stages[name] = measure_stages(data, args.repeats)
+        print(
+            f"{name:<16}{stages[name]['detections']:>5}"
+            + "".join(f"{stages[name][f'{s}_ms']:>15.1f}" for s in STAGES)
+        )
+
+    # a realistic mix: every scenario image goes through the service path
+    samples = list(scenarios.values())
+    end_to_end = []
+    print(f"{'batch':>6}{'conc':>6}{'img/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for batch_size in args.batch_sizes:
+        for concurrency in args.concurrency:
+            result = asyncio.run(
+                measure_end_to_end(samples, batch_size, concurrency, args.requests)
+            )
+            end_to_end.append(
+                {"batch_size": batch_size, "concurrency": concurrency, **result}
+            )
+            print(
+                f"{batch_size:>6}{concurrency:>6}{result['images_per_s']:>9.2f}"
+                f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+                f"{result['p99_ms']:>9.1f}"
+            )
+
+    if args.output:
+        backend = model_module.active.backend
+        report = {
+            "meta": {
+                "commit": _git_commit(),
+                "created": datetime.now(UTC).isoformat(),
+                "model": model_module.model_version,
+                "backend": type(backend).__name__,
+                "precision": model_module.PRECISION,
+                "imgsz": IMGSZ,
+                "decode_size": DECODE_SIZE,
+                "cpus": len(os.sched_getaffinity(0)),
+                "threads_per_worker": os.getenv("RECOGNIZE_THREADS_PER_WORKER"),
+                "machine": platform.processor() or platform.machine(),
+                "python": platform.python_version(),
+            },
+            "stages": stages,
+            "end_to_end": end_to_end,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+import sys
+
+
+if __name__ == "__main__":
+    from src.cpu_profile import apply_profile
+
+    # before any module reads its settings from the environment
+    apply_profile()
+    from src.bulk import main
+
+    sys.exit(main())
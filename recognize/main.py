@@ -1,22 +1,48 @@
 import asyncio
 import os
-import uvicorn
-from src.worker import broker
-from faststream import FastStream
 
 
 if __name__ == "__main__":
+    from src.cpu_profile import apply_profile
+
+    # before any module reads its settings from the environment
+    apply_profile()
     mode = os.getenv("RECOGNIZE_APP_MODE", "amqp")
     if mode == "amqp":
-        app = FastStream(broker=broker)
-        asyncio.run(app.run())
+        from src.supervisor import (
+            THREADS_PER_WORKER,
+            Supervisor,
+            pin_threads,
+            pool_size,
+        )
+
+        workers, threads = pool_size()
+        if workers > 1:
+            Supervisor(workers, threads).run()
+        else:
+            if THREADS_PER_WORKER != "auto":
+                pin_threads(threads)
+            from src.startup import phase
+
+            with phase("imports"):
+                from src.worker import app
+
+            asyncio.run(app.run())
 
     elif mode == "http":
-        uvicorn.run(
-            "src.web_app:app",
-            host="0.0.0.0",
-            port=8000,
-            reload=True,
-        )
+        from src.prefork import HTTP_WORKERS, PreforkServer
+        from src.supervisor import pool_size
+
+        if HTTP_WORKERS == "0":
+            import uvicorn
+
+            uvicorn.run(
+                "src.web_app:app",
+                host="0.0.0.0",
+                port=8000,
+                reload=True,
+            )
+        else:
+            PreforkServer(*pool_size(HTTP_WORKERS)).run()
     else:
         raise ValueError("Mode value must be amqp or http")
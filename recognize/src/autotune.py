@@ -0,0 +1,198 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from .backends import IMGSZ, create_backend
+from .cpu_profile import PROFILE_PATH, format_cpus, parse_cpus
+from .model import BACKEND, BACKEND_MODEL_PATH, PRECISION, THRESHOLD, WEIGHTS_PATH
+from .quantize import image_paths
+from .supervisor import pin_threads
+
+
+def _bench_worker(
+    cpus: list[int],
+    backend: str,
+    weights: str,
+    model_path: str | None,
+    precision: str,
+    paths: list[str],
+    duration: float,
+    barrier,
+    results,
+) -> None:
+    from PIL import Image
+
+    # the same layout a worker gets in production, see cpu_profile.pin_worker
+    os.sched_setaffinity(0, cpus)
+    model = create_backend(backend, weights, model_path, precision)
+    images = [Image.open(path).convert("RGB") for path in paths]
+    for image in images[:2]:
+        model.predict([image], conf=THRESHOLD)
+    latencies = []
+    # every worker measures the same window, like a pool under full load
+    barrier.wait()
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        model.predict([images[len(latencies) % len(images)]], conf=THRESHOLD)
+        latencies.append(time.perf_counter() - start)
+    results.put(latencies)
+
+
+def measure(
+    args: argparse.Namespace,
+    cpus: list[int],
+    threads: int,
+    interop_threads: int,
+    imgsz: int,
+    paths: list[str],
+) -> dict:
+    workers = len(cpus) // threads
+    # spawned workers read these before torch or onnxruntime start
+    pin_threads(threads)
+    os.environ["RECOGNIZE_INTEROP_THREADS"] = str(interop_threads)
+    os.environ["RECOGNIZE_IMGSZ"] = str(imgsz)
+
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_bench_worker,
+            args=(
+                cpus[index * threads : (index + 1) * threads],
+                args.backend,
+                args.weights,
+                args.model_path,
+                args.precision,
+                paths,
+                args.duration,
+                barrier,
+                results,
+            ),
+        )
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        latencies = [
+            latency
+            for _ in processes
+            for latency in results.get(timeout=args.duration + 600)
+        ]
+    finally:
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "workers": workers,
+        "threads": threads,
+        "interop_threads": interop_threads,
+        "imgsz": imgsz,
+        "images_per_s": len(latencies) / args.duration,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    cpus = sorted(os.sched_getaffinity(0))
+    parser = argparse.ArgumentParser(
+        prog="python -m src.autotune",
+        description="Sweep workers x threads, inter-op threads and input size on "
+        "this machine and write the profile with the best throughput whose p95 "
+        "latency stays within the target.",
+    )
+    parser.add_argument("--images", required=True, help="directory of tray photos")
+    parser.add_argument("--target-p95-ms", type=float, required=True)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="+",
+        default=[t for t in (1, 2, 4, 8, 16) if t <= len(cpus)],
+        help="intra-op threads per worker; workers fill the remaining cores",
+    )
+    parser.add_argument("--interop-threads", type=int, nargs="+", default=[1])
+    parser.add_argument(
+        "--imgsz",
+        type=int,
+        nargs="+",
+        default=[IMGSZ],
+        help="input sizes to try; smaller is faster but can miss small tools, "
+        "check accuracy before serving one",
+    )
+    parser.add_argument("--cpus", help="cores to tune for, e.g. 0-7 (default: all)")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--limit", type=int, default=50, help="images per worker")
+    parser.add_argument("--backend", default=BACKEND)
+    parser.add_argument("--weights", default=WEIGHTS_PATH)
+    parser.add_argument("--model-path", default=BACKEND_MODEL_PATH)
+    parser.add_argument("--precision", default=PRECISION)
+    parser.add_argument("--output", default=PROFILE_PATH or "profile.json")
+    parser.add_argument("--report", help="write every measured setting as JSON")
+    args = parser.parse_args(argv)
+
+    if args.cpus:
+        cpus = parse_cpus(args.cpus)
+    paths = [str(path) for path in image_paths(args.images)[: args.limit]]
+    # exports the model once here instead of racing in every worker
+    create_backend(args.backend, args.weights, args.model_path, args.precision)
+
+    runs = []
+    print(
+        f"{'workers':>8}{'threads':>8}{'interop':>8}{'imgsz':>7}{'img/s':>9}"
+        f"{'p50 ms':>9}{'p95 ms':>9}"
+    )
+    for imgsz in args.imgsz:
+        for threads in sorted(set(args.threads)):
+            if threads > len(cpus):
+                continue
+            for interop_threads in args.interop_threads:
+                run = measure(args, cpus, threads, interop_threads, imgsz, paths)
+                runs.append(run)
+                print(
+                    f"{run['workers']:>8}{threads:>8}{interop_threads:>8}{imgsz:>7}"
+                    f"{run['images_per_s']:>9.2f}{run['p50_ms']:>9.1f}"
+                    f"{run['p95_ms']:>9.1f}"
+                )
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(runs, f, indent=2)
+    within = [run for run in runs if run["p95_ms"] <= args.target_p95_ms]
+    if within:
+        best = max(within, key=lambda run: run["images_per_s"])
+    else:
+        best = min(runs, key=lambda run: run["p95_ms"])
+        print(
+            f"No setting reaches p95 {args.target_p95_ms:.0f} ms, "
+            f"writing the lowest latency one"
+        )
+    profile = {
+        "workers": best["workers"],
+        "threads": best["threads"],
+        "interop_threads": best["interop_threads"],
+        "cpus": format_cpus(cpus[: best["workers"] * best["threads"]]),
+        "imgsz": best["imgsz"],
+    }
+    with open(args.output, "w") as f:
+        json.dump(profile, f, indent=2)
+    print(
+        f"Profile written to {args.output}: {profile}, "
+        f"{best['images_per_s']:.2f} img/s at p95 {best['p95_ms']:.1f} ms; "
+        f"serve it with RECOGNIZE_PROFILE_PATH={args.output}"
+    )
+    return 0 if within else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+import ast
+import os
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+from PIL import Image
+
+IMGSZ = int(os.getenv("RECOGNIZE_IMGSZ", "640"))
+IOU_THRESHOLD = float(os.getenv("RECOGNIZE_IOU_THRESHOLD", "0.7"))
+MAX_DETECTIONS = int(os.getenv("RECOGNIZE_MAX_DETECTIONS", "300"))
+CPU_THREADS = int(os.getenv("RECOGNIZE_CPU_THREADS", "0"))
+# threads running independent operators in parallel, 0 keeps the library
+# default; YOLO is one sequential chain, so more than 1 rarely helps on CPU
+INTEROP_THREADS = int(os.getenv("RECOGNIZE_INTEROP_THREADS", "0"))
+# boxes of different classes are shifted this far apart so one NMS pass never
+# suppresses across classes, same trick as ultralytics
+_CLASS_OFFSET = 7680
+
+
+class Backend(Protocol):
+    path: str
+    names: dict[int, str]
+
+    # one (N, 6) array per image: x1, y1, x2, y2, confidence, class in
+    # original image coordinates; classes restricts detections to those ids
+    def predict(
+        self,
+        images: list[Image.Image],
+        conf: float,
+        classes: list[int] | None = None,
+    ) -> list[np.ndarray]: ...
+
+
+def letterbox(
+    image: Image.Image, size: int = IMGSZ
+) -> tuple[np.ndarray, float, tuple[float, float]]:
+    width, height = image.size
+    ratio = min(size / width, size / height)
+    new_width, new_height = round(width * ratio), round(height * ratio)
+    pad_x, pad_y = (size - new_width) / 2, (size - new_height) / 2
+    left, top = round(pad_x - 0.1), round(pad_y - 0.1)
+
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    if (new_width, new_height) != (width, height):
+        image = image.resize((new_width, new_height), Image.Resampling.BILINEAR)
+    canvas[top : top + new_height, left : left + new_width] = np.asarray(image)
+    return canvas, ratio, (left, top)
+
+
+def to_input_tensor(canvases: list[np.ndarray]) -> np.ndarray:
+    # NHWC uint8 -> NCHW float32 in [0, 1]
+    batch = np.stack(canvases).transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.clip(
+            np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None
+        )
+        inter_h = np.clip(
+            np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None
+        )
+        inter = inter_w * inter_h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def postprocess(
+    prediction: np.ndarray,
+    conf: float,
+    ratio: float,
+    pad: tuple[float, float],
+    image_size: tuple[int, int],
+    iou_threshold: float = IOU_THRESHOLD,
+    max_detections: int = MAX_DETECTIONS,
+    classes: list[int] | None = None,
+) -> np.ndarray:
+    # prediction is the raw (4 + classes, anchors) head output for one image
+    prediction = prediction.T
+    scores = prediction[:, 4:]
+    class_ids = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), class_ids]
+    mask = confidences >= conf
+    if classes is not None:
+        # same as ultralytics: anchors whose best class is not allowed are
+        # dropped before box decoding and NMS
+        mask &= np.isin(class_ids, classes)
+    if not mask.any():
+        return np.zeros((0, 6), dtype=np.float32)
+
+    xywh = prediction[mask, :4]
+    class_ids = class_ids[mask]
+    confidences = confidences[mask]
+    boxes = np.empty_like(xywh)
+    boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+    boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+
+    keep = nms(boxes + class_ids[:, None] * _CLASS_OFFSET, confidences, iou_threshold)
+    keep = keep[:max_detections]
+    boxes, confidences, class_ids = boxes[keep], confidences[keep], class_ids[keep]
+
+    boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / ratio
+    boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / ratio
+    width, height = image_size
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+    return np.concatenate(
+        [boxes, confidences[:, None], class_ids[:, None]], axis=1
+    ).astype(np.float32)
+
+
+def _cpu_threads() -> int:
+    return CPU_THREADS or len(os.sched_getaffinity(0))
+
+
+class TorchBackend:
+    def __init__(self, path: str) -> None:
+        import torch
+        from ultralytics import YOLO
+
+        if CPU_THREADS:
+            torch.set_num_threads(CPU_THREADS)
+        # can only be set once per process, before any inter-op work ran
+        if INTEROP_THREADS and torch.get_num_interop_threads() != INTEROP_THREADS:
+            torch.set_num_interop_threads(INTEROP_THREADS)
+        self.path = path
+        self._model = YOLO(path)
+        self.names = dict(self._model.names)
+        self._local = threading.local()
+        self._owner: int | None = None
+        self._owner_lock = threading.Lock()
+
+    def _thread_model(self):
+        # ultralytics predictors keep per-call state and are not thread-safe,
+        # so every inference thread beyond the first gets its own instance
+        with self._owner_lock:
+            if self._owner is None:
+                self._owner = threading.get_ident()
+        if threading.get_ident() == self._owner:
+            return self._model
+        model = getattr(self._local, "model", None)
+        if model is None:
+            from ultralytics import YOLO
+
+            model = self._local.model = YOLO(self.path)
+        return model
+
+    def predict(
+        self,
+        images: list[Image.Image],
+        conf: float,
+        classes: list[int] | None = None,
+    ) -> list[np.ndarray]:
+        # a list input is letterboxed into one tensor and runs as a single forward pass
+        results = self._thread_model()(
+            images,
+            conf=conf,
+            classes=classes,
+            iou=IOU_THRESHOLD,
+            imgsz=IMGSZ,
+            max_det=MAX_DETECTIONS,
+            verbose=False,
+        )
+        # single device-to-host copy per result
+        return [
+            result.boxes.data.cpu().numpy()
+            if result.boxes is not None
+            else np.zeros((0, 6), dtype=np.float32)
+            for result in results
+        ]
+
+
+class _NumpyPipelineBackend(ABC):
+    path: str
+    names: dict[int, str]
+    _batch_size: int | None
+
+    # raw model output of one preprocessed (B, 3, IMGSZ, IMGSZ) batch
+    @abstractmethod
+    def _infer(self, batch: np.ndarray) -> np.ndarray: ...
+
+    def predict(
+        self,
+        images: list[Image.Image],
+        conf: float,
+        classes: list[int] | None = None,
+    ) -> list[np.ndarray]:
+        letterboxed = [letterbox(image, IMGSZ) for image in images]
+        canvases = [canvas for canvas, _, _ in letterboxed]
+        step = self._batch_size or len(canvases)
+        outputs = []
+        for start in range(0, len(canvases), step):
+            chunk = canvases[start : start + step]
+            # statically shaped models get the last chunk padded to full size
+            padding = [chunk[0]] * (step - len(chunk))
+            outputs.extend(self._infer(to_input_tensor(chunk + padding))[: len(chunk)])
+        return [
+            postprocess(output, conf, ratio, pad, image.size, classes=classes)
+            for output, (_, ratio, pad), image in zip(outputs, letterboxed, images)
+        ]
+
+
+class OnnxBackend(_NumpyPipelineBackend):
+    def __init__(self, path: str) -> None:
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # inter-op threads are only used in parallel execution mode
+        options.execution_mode = (
+            ort.ExecutionMode.ORT_PARALLEL
+            if INTEROP_THREADS > 1
+            else ort.ExecutionMode.ORT_SEQUENTIAL
+        )
+        options.intra_op_num_threads = _cpu_threads()
+        options.inter_op_num_threads = INTEROP_THREADS or 1
+        self.path = path
+        self._session = ort.InferenceSession(
+            path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        metadata = self._session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"])
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        # statically exported models only accept their own batch size
+        batch_dim = model_input.shape[0]
+        self._batch_size = batch_dim if isinstance(batch_dim, int) else None
+
+    def _infer(self, batch: np.ndarray) -> np.ndarray:
+        return self._session.run(None, {self._input_name: batch})[0]
+
+
+class OpenVinoBackend(_NumpyPipelineBackend):
+    def __init__(self, path: str) -> None:
+        import openvino as ov
+        import yaml
+
+        model_dir = Path(path)
+        core = ov.Core()
+        ov_model = core.read_model(next(model_dir.glob("*.xml")))
+        batch_dim = ov_model.inputs[0].get_partial_shape()[0]
+        self._batch_size = batch_dim.get_length() if batch_dim.is_static else None
+        self._compiled = core.compile_model(
+            ov_model,
+            "CPU",
+            {
+                "PERFORMANCE_HINT": "LATENCY",
+                "INFERENCE_NUM_THREADS": _cpu_threads(),
+            },
+        )
+        self._output = self._compiled.output(0)
+        self._local = threading.local()
+        self.path = path
+        with open(model_dir / "metadata.yaml") as f:
+            self.names = yaml.safe_load(f)["names"]
+
+    def _infer(self, batch: np.ndarray) -> np.ndarray:
+        # a compiled model is shared, infer requests are per thread
+        request = getattr(self._local, "request", None)
+        if request is None:
+            request = self._local.request = self._compiled.create_infer_request()
+        return request.infer({0: batch})[self._output]
+
+
+BACKENDS = {
+    "torch": TorchBackend,
+    "onnx": OnnxBackend,
+    "openvino": OpenVinoBackend,
+}
+EXPORT_FORMATS = {"onnx": ".onnx", "openvino": "_openvino_model"}
+INT8_SUFFIX = ".int8.onnx"
+
+
+def export_path(weights_path: str, backend: str) -> str:
+    return str(Path(weights_path).with_suffix("")) + EXPORT_FORMATS[backend]
+
+
+def int8_path(weights_path: str) -> str:
+    return str(Path(weights_path).with_suffix("")) + INT8_SUFFIX
+
+
+def export_model(weights_path: str, backend: str) -> str:
+    from ultralytics import YOLO
+
+    # dynamic axes keep the batch dimension open for micro-batching
+    # simplify is an onnx-only export argument
+    options = {"simplify": True} if backend == "onnx" else {}
+    return YOLO(weights_path).export(
+        format=backend, imgsz=IMGSZ, dynamic=True, **options
+    )
+
+
+def create_backend(
+    name: str,
+    weights_path: str,
+    path: str | None = None,
+    precision: str = "fp32",
+) -> Backend:
+    if name not in BACKENDS:
+        raise ValueError(f"Backend must be one of {', '.join(BACKENDS)}, got {name}")
+    if precision not in ("fp32", "int8"):
+        raise ValueError(f"Precision must be fp32 or int8, got {precision}")
+    if precision == "int8":
+        if name != "onnx":
+            raise ValueError("INT8 models are served through the onnx backend")
+        # never produced on the fly: only python -m src.quantize activates one,
+        # after it has passed the accuracy gate
+        path = path or int8_path(weights_path)
+    elif name == "torch":
+        path = path or weights_path
+    else:
+        # a derived export older than its weights is made again, so replaced
+        # weights do not keep serving the old export after a reload
+        exported = export_path(weights_path, name)
+        stale = (
+            path is None
+            and os.path.exists(exported)
+            and os.path.exists(weights_path)
+            and os.path.getmtime(weights_path) > os.path.getmtime(exported)
+        )
+        path = path or exported
+        if not os.path.exists(path) or stale:
+            if not os.path.exists(weights_path):
+                raise FileNotFoundError(f"Model file {path} not found")
+            print(f"Exporting {weights_path} to {name}")
+            path = export_model(weights_path, name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model file {path} not found")
+    return BACKENDS[name](path)
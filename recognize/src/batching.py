@@ -0,0 +1,183 @@
+import asyncio
+import itertools
+import os
+from dataclasses import dataclass
+
+from PIL import Image
+
+from .executor import (
+    DeadlineExceeded,
+    InferenceExecutor,
+    expired,
+    inference_executor,
+)
+from .metrics import Counter, Histogram
+from .model import recognize_batch
+from .schemas import Detection, KitHints
+
+BATCH_SIZE = int(os.getenv("RECOGNIZE_BATCH_SIZE", "8"))
+BATCH_LINGER_MS = float(os.getenv("RECOGNIZE_BATCH_LINGER_MS", "10"))
+BATCH_STATS_EVERY = int(os.getenv("RECOGNIZE_BATCH_STATS_EVERY", "100"))
+# lanes, a lower one is batched first and lanes never share a forward pass:
+# an interactive image does not wait for a full batch of bulk ones
+INTERACTIVE = 0
+BULK = 1
+LANE_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+batch_size_histogram = Histogram(
+    "recognize_batch_size",
+    "Images per batched forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+batch_fill_histogram = Histogram(
+    "recognize_batch_fill_ratio",
+    "Batch size relative to the configured maximum batch size",
+    buckets=(0.125, 0.25, 0.5, 0.75, 1.0),
+)
+batch_linger_counter = Counter(
+    "recognize_batch_linger_expired_total",
+    "Batches dispatched because the linger time ran out before the batch filled",
+)
+
+
+@dataclass
+class _PendingImage:
+    image: Image.Image
+    future: asyncio.Future[list[Detection]]
+    hints: KitHints | None = None
+    deadline: float | None = None
+    lane: int = INTERACTIVE
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        max_batch_size: int = BATCH_SIZE,
+        linger_ms: float = BATCH_LINGER_MS,
+        executor: InferenceExecutor = inference_executor,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.max_batch_size = max_batch_size
+        self.linger = linger_ms / 1000
+        self._executor = executor
+        # (lane, arrival, image): first in first out within a lane
+        self._queue: asyncio.PriorityQueue[tuple[int, int, _PendingImage]] | None = None
+        self._arrivals = itertools.count()
+        self._slots: asyncio.Semaphore | None = None
+        self._task: asyncio.Task | None = None
+        self._batches: set[asyncio.Task] = set()
+
+    def _ensure_running(self) -> asyncio.PriorityQueue:
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._slots = asyncio.Semaphore(self._executor.concurrency)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._queue
+
+    async def submit(
+        self,
+        image: Image.Image,
+        hints: KitHints | None = None,
+        deadline: float | None = None,
+        lane: int = INTERACTIVE,
+    ) -> list[Detection]:
+        queue = self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        pending = _PendingImage(
+            image=image, future=future, hints=hints, deadline=deadline, lane=lane
+        )
+        await queue.put((lane, next(self._arrivals), pending))
+        return await future
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _collect(self, queue: asyncio.PriorityQueue) -> list[_PendingImage]:
+        loop = asyncio.get_running_loop()
+        first = await queue.get()
+        batch = [first[2]]
+        deadline = loop.time() + self.linger
+        while len(batch) < self.max_batch_size:
+            if not queue.empty():
+                item = queue.get_nowait()
+            else:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    batch_linger_counter.inc()
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except TimeoutError:
+                    batch_linger_counter.inc()
+                    break
+            if item[0] != first[0]:
+                # another lane goes into the next batch; an interactive image
+                # that arrives stops a bulk batch from lingering
+                queue.put_nowait(item)
+                break
+            batch.append(item[2])
+        return batch
+
+    async def _run(self) -> None:
+        assert self._queue is not None and self._slots is not None
+        while True:
+            # a batch is only collected once a forward pass slot is free, so
+            # images keep accumulating while inference is busy
+            await self._slots.acquire()
+            try:
+                batch = await self._collect(self._queue)
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task: asyncio.Task) -> None:
+        self._batches.discard(task)
+        assert self._slots is not None
+        self._slots.release()
+
+    async def _run_batch(self, batch: list[_PendingImage]) -> None:
+        # callers that gave up or whose deadline passed while waiting do not
+        # take a batch slot
+        for pending in batch:
+            if not pending.future.done() and expired(pending.deadline):
+                pending.future.set_exception(DeadlineExceeded("batch"))
+        batch = [pending for pending in batch if not pending.future.done()]
+        if not batch:
+            return
+
+        try:
+            results = await self._executor.run(
+                recognize_batch,
+                [pending.image for pending in batch],
+                [pending.hints for pending in batch],
+            )
+        except Exception as e:
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+        else:
+            for pending, detections in zip(batch, results):
+                if not pending.future.done():
+                    pending.future.set_result(detections)
+
+        batch_size_histogram.observe(len(batch))
+        batch_fill_histogram.observe(len(batch) / self.max_batch_size)
+        batches = batch_size_histogram.count()
+        if BATCH_STATS_EVERY and batches % BATCH_STATS_EVERY == 0:
+            print(
+                f"Batches: {batches}, "
+                f"mean size: {batch_size_histogram.mean():.2f}, "
+                f"mean fill: {batch_fill_histogram.mean():.0%}, "
+                f"linger expired: {int(batch_linger_counter.value())}"
+            )
@@ -0,0 +1,225 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tarfile
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, TextIO
+
+from PIL import Image
+
+from .batching import BATCH_SIZE
+from .executor import decode_image
+from .model import load_model, recognize_batch, rescale_detections
+from .quantize import IMAGE_SUFFIXES
+from .schemas import DetectResponse
+
+REPORT_EVERY_S = 10.0
+
+
+def iter_inputs(source: str, skip: int = 0) -> Iterator[tuple[str, str | bytes]]:
+    # (name, path) for a directory, (name, bytes) for a tar archive, in a
+    # stable order so a checkpoint can count what is done
+    index = 0
+    if os.path.isdir(source):
+        for path in sorted(Path(source).rglob("*")):
+            if path.suffix.lower() in IMAGE_SUFFIXES and path.is_file():
+                if index >= skip:
+                    yield str(path.relative_to(source)), str(path)
+                index += 1
+        return
+    # streamed, compressed archives are never unpacked to disk
+    with tarfile.open(source, "r|*") as archive:
+        for member in archive:
+            if member.isfile() and Path(member.name).suffix.lower() in IMAGE_SUFFIXES:
+                if index >= skip:
+                    yield member.name, archive.extractfile(member).read()
+                index += 1
+
+
+def _decode(source: str | bytes) -> tuple[Image.Image, tuple[float, float]]:
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            source = f.read()
+    return decode_image(source)
+
+
+def _read_checkpoint(path: str | None, source: str) -> tuple[int, int | None]:
+    if path is None or not os.path.exists(path):
+        return 0, None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint["source"] != os.path.abspath(source):
+        raise ValueError(f"Checkpoint {path} belongs to {checkpoint['source']}")
+    return checkpoint["done"], checkpoint.get("output_size")
+
+
+def _write_checkpoint(
+    path: str, source: str, done: int, output_size: int | None
+) -> None:
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(
+            {
+                "source": os.path.abspath(source),
+                "done": done,
+                "output_size": output_size,
+            },
+            f,
+        )
+    os.replace(temporary, path)
+
+
+class _Progress:
+    def __init__(self, done: int) -> None:
+        self.start = time.perf_counter()
+        self.last_report = self.start
+        self.resumed_at = done
+        self.done = done
+        self.failed = 0
+
+    def update(self, images: int, failed: int) -> None:
+        self.done += images
+        self.failed += failed
+        now = time.perf_counter()
+        if now - self.last_report >= REPORT_EVERY_S:
+            self.last_report = now
+            self.report()
+
+    def report(self, final: bool = False) -> None:
+        elapsed = time.perf_counter() - self.start
+        processed = self.done - self.resumed_at
+        print(
+            f"{'Done: ' if final else ''}{self.done} images "
+            f"({processed} this run, {self.failed} failed), "
+            f"{processed / elapsed if elapsed else 0:.2f} img/s",
+            file=sys.stderr,
+        )
+
+
+def _write_batch(
+    output: TextIO,
+    names: list[str],
+    images: list[tuple[Image.Image, tuple[float, float]] | Exception],
+) -> int:
+    decoded = [image for image in images if not isinstance(image, Exception)]
+    batch = iter(recognize_batch([image for image, _ in decoded]) if decoded else [])
+    failed = 0
+    for name, image in zip(names, images):
+        if isinstance(image, Exception):
+            failed += 1
+            response = DetectResponse(
+                success=False,
+                detections=[],
+                total_detections=0,
+                error=type(image).__name__,
+            )
+        else:
+            detections = rescale_detections(next(batch), image[1])
+            response = DetectResponse(
+                detections=detections, total_detections=len(detections)
+            )
+        output.write(json.dumps({"image": name, **response.model_dump()}) + "\n")
+    output.flush()
+    return failed
+
+
+def run(
+    source: str,
+    output: TextIO,
+    checkpoint: str | None,
+    done: int,
+    batch_size: int,
+    decode_workers: int,
+) -> _Progress:
+    progress = _Progress(done)
+    # spawned, the decode processes never inherit the loaded model
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(decode_workers, mp_context=context) as pool:
+        # bounded read-ahead: decoding runs ahead of inference by a few
+        # batches without holding the whole archive in memory
+        pending: deque[tuple[str, Future]] = deque()
+        inputs = iter_inputs(source, done)
+        names: list[str] = []
+        images: list = []
+        while True:
+            while len(pending) < batch_size * 2 + decode_workers:
+                item = next(inputs, None)
+                if item is None:
+                    break
+                pending.append((item[0], pool.submit(_decode, item[1])))
+            if not pending:
+                break
+
+            name, future = pending.popleft()
+            names.append(name)
+            try:
+                images.append(future.result())
+            except Exception as e:
+                images.append(e)
+            if len(names) == batch_size or not pending:
+                failed = _write_batch(output, names, images)
+                progress.update(len(names), failed)
+                if checkpoint is not None:
+                    _write_checkpoint(
+                        checkpoint,
+                        source,
+                        progress.done,
+                        output.tell() if output.seekable() else None,
+                    )
+                names, images = [], []
+    return progress
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python bulk.py",
+        description="Detect tools on every image of a directory or tar archive "
+        "and write one JSON result per line.",
+    )
+    parser.add_argument("source", help="image directory or tar archive")
+    parser.add_argument("--output", help="NDJSON file to write, stdout by default")
+    parser.add_argument(
+        "--checkpoint",
+        help="progress file to resume from, defaults to <output>.checkpoint",
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument(
+        "--decode-workers", type=int, default=max(1, len(os.sched_getaffinity(0)) // 2)
+    )
+    args = parser.parse_args(argv)
+
+    checkpoint = args.checkpoint or (
+        f"{args.output}.checkpoint" if args.output else None
+    )
+    done, output_size = _read_checkpoint(checkpoint, args.source)
+    if done:
+        print(f"Resuming after {done} images from {checkpoint}", file=sys.stderr)
+    load_model()
+
+    if args.output:
+        output = open(args.output, "a" if done else "w")
+        # lines written after the last checkpoint are produced again
+        if output_size is not None:
+            output.truncate(output_size)
+            output.seek(output_size)
+    else:
+        output = sys.stdout
+    try:
+        progress = run(
+            args.source,
+            output,
+            checkpoint,
+            done,
+            args.batch_size,
+            args.decode_workers,
+        )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    progress.report(final=True)
+    return 0
@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+
+from . import model as model_module
+from .metrics import Counter
+from .schemas import DetectResponse, KitHints
+
+CACHE_SIZE = int(os.getenv("RECOGNIZE_CACHE_SIZE", "1024"))
+CACHE_TTL_S = float(os.getenv("RECOGNIZE_CACHE_TTL_S", "300"))
+
+cache_requests_counter = Counter(
+    "recognize_cache_requests_total",
+    "Detection requests by result cache outcome: hit, miss or coalesced",
+)
+
+
+def result_key(image_bytes: bytes, hints: KitHints | None = None) -> Hashable:
+    # the model must be loaded first, a reload or another threshold must not
+    # serve results of the previous model; the kit hints prune classes and
+    # can send the image through the other cascade stage
+    return (
+        hashlib.blake2b(image_bytes, digest_size=16).digest(),
+        model_module.model_version,
+        model_module.THRESHOLD,
+        hints.cache_key() if hints else None,
+    )
+
+
+class ResultCache:
+    def __init__(
+        self, max_entries: int = CACHE_SIZE, ttl_s: float = CACHE_TTL_S
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl_s
+        self._entries: OrderedDict[Hashable, tuple[float, DetectResponse]] = (
+            OrderedDict()
+        )
+        self._in_flight: dict[Hashable, asyncio.Future[DetectResponse]] = {}
+
+    def get(self, key: Hashable) -> DetectResponse | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def put(self, key: Hashable, response: DetectResponse) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(
+        self, key: Hashable, compute: Callable[[], Awaitable[DetectResponse]]
+    ) -> DetectResponse:
+        response = self.get(key)
+        if response is not None:
+            cache_requests_counter.inc(result="hit")
+            return response
+
+        # a retry of an image that is still being recognized waits for that
+        # inference instead of starting a second one
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            cache_requests_counter.inc(result="coalesced")
+            return await asyncio.shield(in_flight)
+
+        cache_requests_counter.inc(result="miss")
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            response = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # marks it retrieved, the caller that started the inference
+            # raises it even when nobody coalesced onto it
+            future.exception()
+            raise
+        else:
+            # failed detections are reported to the caller but not kept
+            if response.success:
+                self.put(key, response)
+            future.set_result(response)
+            return response
+        finally:
+            del self._in_flight[key]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "in_flight": len(self._in_flight),
+            **{
+                result: int(cache_requests_counter.value(result=result))
+                for result in ("hit", "miss", "coalesced")
+            },
+        }
+
+
+result_cache = ResultCache()
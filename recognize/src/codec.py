@@ -0,0 +1,119 @@
+import struct
+import sys
+from array import array
+
+from .schemas import Detection, DetectionBBox, DetectResponse
+
+# Compact detection reply, requested with the x-reply-format header (AMQP) or
+# the Accept header (HTTP). All numbers are little-endian:
+#   header   magic "DET1", success (bool), detections (u32), error length (u16)
+#   error    utf-8 text, "ImageRejected:<reason>" for a rejected photo
+#   names    count (u16), then per class: class id (u16), length (u8), utf-8
+#   columns  class ids u16[n], confidences f32[n], boxes f32[n * 4] (x1 y1 x2 y2)
+MAGIC = b"DET1"
+CONTENT_TYPE = "application/x-detections"
+REPLY_FORMAT = "det1"
+_HEADER = struct.Struct("<4s?IH")
+_COUNT = struct.Struct("<H")
+_NAME = struct.Struct("<HB")
+
+
+def _column(typecode: str, values) -> bytes:
+    column = array(typecode, values)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_column(
+    typecode: str, data: bytes, offset: int, count: int
+) -> tuple[array, int]:
+    column = array(typecode)
+    end = offset + column.itemsize * count
+    column.frombytes(data[offset:end])
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column, end
+
+
+def encode_response(response: DetectResponse) -> bytes:
+    detections = response.detections
+    error = response.error or ""
+    if response.reject_reason:
+        error = f"{error}:{response.reject_reason}"
+    error = error.encode("utf-8")
+    names = {detection.class_id: detection.class_name for detection in detections}
+
+    parts = [
+        _HEADER.pack(MAGIC, response.success, len(detections), len(error)),
+        error,
+        _COUNT.pack(len(names)),
+    ]
+    for class_id, class_name in names.items():
+        encoded = class_name.encode("utf-8")
+        parts.append(_NAME.pack(class_id, len(encoded)))
+        parts.append(encoded)
+    parts.append(_column("H", (detection.class_id for detection in detections)))
+    parts.append(_column("f", (detection.confidence for detection in detections)))
+    parts.append(
+        _column(
+            "f",
+            (
+                value
+                for detection in detections
+                for value in (
+                    detection.bbox.x1,
+                    detection.bbox.y1,
+                    detection.bbox.x2,
+                    detection.bbox.y2,
+                )
+            ),
+        )
+    )
+    return b"".join(parts)
+
+
+def decode_response(data: bytes) -> DetectResponse:
+    magic, success, count, error_length = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"Not a compact detection reply: {magic!r}")
+    offset = _HEADER.size
+    error, _, reject_reason = (
+        data[offset : offset + error_length].decode("utf-8").partition(":")
+    )
+    offset += error_length
+
+    (names_count,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    names = {}
+    for _ in range(names_count):
+        class_id, length = _NAME.unpack_from(data, offset)
+        offset += _NAME.size
+        names[class_id] = data[offset : offset + length].decode("utf-8")
+        offset += length
+
+    class_ids, offset = _read_column("H", data, offset, count)
+    confidences, offset = _read_column("f", data, offset, count)
+    boxes, offset = _read_column("f", data, offset, count * 4)
+    # the payload is produced by our own encoder, skip pydantic validation
+    detections = [
+        Detection.model_construct(
+            class_id=class_id,
+            class_name=names[class_id],
+            confidence=confidence,
+            bbox=DetectionBBox.model_construct(
+                x1=boxes[i * 4],
+                y1=boxes[i * 4 + 1],
+                x2=boxes[i * 4 + 2],
+                y2=boxes[i * 4 + 3],
+            ),
+        )
+        for i, (class_id, confidence) in enumerate(zip(class_ids, confidences))
+    ]
+    return DetectResponse.model_construct(
+        success=success,
+        detections=detections,
+        total_detections=count,
+        error=error or None,
+        reject_reason=reject_reason or None,
+    )
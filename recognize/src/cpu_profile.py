@@ -0,0 +1,75 @@
+import json
+import os
+
+# JSON inference profile, as written by python -m src.autotune, e.g.
+#   {"workers": 2, "threads": 4, "interop_threads": 1, "cpus": "0-7", "imgsz": 640}
+# Its values are defaults: an environment variable that is set explicitly wins
+PROFILE_PATH = os.getenv("RECOGNIZE_PROFILE_PATH") or None
+PROFILE_SETTINGS = {
+    "workers": ("RECOGNIZE_WORKERS", "RECOGNIZE_HTTP_WORKERS"),
+    "threads": ("RECOGNIZE_THREADS_PER_WORKER",),
+    "interop_threads": ("RECOGNIZE_INTEROP_THREADS",),
+    "cpus": ("RECOGNIZE_CPU_AFFINITY",),
+    "imgsz": ("RECOGNIZE_IMGSZ",),
+}
+
+
+def parse_cpus(value: str) -> list[int]:
+    # taskset style list: "0-3,8,10-11"
+    cpus = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        first, _, last = item.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return sorted(set(cpus))
+
+
+def format_cpus(cpus: list[int]) -> str:
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(
+        str(first) if first == last else f"{first}-{last}" for first, last in ranges
+    )
+
+
+def load_profile(path: str | None = PROFILE_PATH) -> dict:
+    if path is None:
+        return {}
+    with open(path) as f:
+        profile = json.load(f)
+    unknown = set(profile) - set(PROFILE_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown profile settings: {', '.join(sorted(unknown))}")
+    return profile
+
+
+def apply_profile(path: str | None = PROFILE_PATH) -> dict:
+    # runs before anything reads these settings, and before torch or
+    # onnxruntime start their thread pools
+    profile = load_profile(path)
+    for key, value in profile.items():
+        for name in PROFILE_SETTINGS[key]:
+            os.environ.setdefault(name, str(value))
+    affinity = os.getenv("RECOGNIZE_CPU_AFFINITY")
+    if affinity:
+        os.sched_setaffinity(0, parse_cpus(affinity))
+    if profile:
+        print(f"Inference profile {path}: {profile}")
+    return profile
+
+
+def pin_worker(index: int, threads: int) -> None:
+    # with an explicit affinity every worker gets its own cores, so workers do
+    # not migrate onto each other's; too few cores leaves them shared
+    if not os.getenv("RECOGNIZE_CPU_AFFINITY"):
+        return
+    cpus = sorted(os.sched_getaffinity(0))
+    own = cpus[index * threads : (index + 1) * threads]
+    if len(own) == threads:
+        os.sched_setaffinity(0, own)
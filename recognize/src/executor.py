@@ -0,0 +1,218 @@
+import asyncio
+import io
+import os
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import cache, partial
+from typing import Callable, TypeVar
+
+from PIL import Image
+
+from .backends import IMGSZ
+from .metrics import Counter, Gauge, Histogram
+from .quality import check as check_quality
+
+INFERENCE_CONCURRENCY = int(os.getenv("RECOGNIZE_INFERENCE_CONCURRENCY", "1"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("RECOGNIZE_INFERENCE_QUEUE_SIZE", "32"))
+# the part of the queue batch uploads may hold, the rest is kept free for
+# interactive requests
+BULK_QUEUE_SIZE = int(
+    os.getenv("RECOGNIZE_BULK_QUEUE_SIZE", str(INFERENCE_QUEUE_SIZE // 4))
+)
+DECODE_THREADS = int(os.getenv("RECOGNIZE_DECODE_THREADS", "2"))
+# JPEGs are decoded straight to the smallest DCT scale whose long side still
+# covers this size, 0 decodes at full resolution
+DECODE_SIZE = int(os.getenv("RECOGNIZE_DECODE_SIZE", str(IMGSZ)))
+DECODER = os.getenv("RECOGNIZE_DECODER", "pil")
+
+T = TypeVar("T")
+
+request_stage_histogram = Histogram(
+    "recognize_request_stage_seconds",
+    "Time a request spends in each stage: queue (broker), fetch (claim check "
+    "download), decode, quality (pre-check), inference (batching and forward "
+    "pass) and serialize",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+request_errors_counter = Counter(
+    "recognize_request_errors_total",
+    "Failed detection requests by exception type",
+)
+expired_requests_counter = Counter(
+    "recognize_expired_requests_total",
+    "Requests dropped because their deadline passed, by the stage they were in",
+)
+
+
+class InferenceQueueFull(Exception):
+    def __init__(self, capacity: int) -> None:
+        super().__init__(f"Inference queue is full ({capacity} requests admitted)")
+        self.capacity = capacity
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str) -> None:
+        super().__init__(f"Deadline passed before {stage} finished")
+        self.stage = stage
+
+
+def expired(deadline: float | None) -> bool:
+    # deadlines are absolute unix times set by the caller
+    return deadline is not None and deadline <= time.time()
+
+
+class InferenceExecutor:
+    def __init__(
+        self,
+        concurrency: int = INFERENCE_CONCURRENCY,
+        queue_size: int = INFERENCE_QUEUE_SIZE,
+        decode_threads: int = DECODE_THREADS,
+        bulk_queue_size: int = BULK_QUEUE_SIZE,
+    ) -> None:
+        self.concurrency = concurrency
+        self.capacity = queue_size
+        self.bulk_capacity = min(bulk_queue_size, queue_size)
+        self._inference_pool = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="inference"
+        )
+        # a separate pool so the next image is decoded while the current
+        # forward pass runs; PIL releases the GIL while decoding
+        self._decode_pool = ThreadPoolExecutor(
+            max_workers=decode_threads, thread_name_prefix="decode"
+        )
+        self.admitted = 0
+        self.bulk_admitted = 0
+        self._released = asyncio.Event()
+
+    @asynccontextmanager
+    async def admit(self, images: int = 1, bulk: bool = False):
+        # requests are counted from admission to reply, so capacity bounds
+        # everything waiting for decode, a batch slot or the forward pass
+        if self.admitted + images > self.capacity:
+            raise InferenceQueueFull(self.capacity)
+        if bulk and self.bulk_admitted + images > self.bulk_capacity:
+            raise InferenceQueueFull(self.bulk_capacity)
+        self.admitted += images
+        if bulk:
+            self.bulk_admitted += images
+        try:
+            yield
+        finally:
+            self.admitted -= images
+            if bulk:
+                self.bulk_admitted -= images
+            self._released.set()
+            self._released = asyncio.Event()
+
+    async def wait_for_capacity(self, timeout: float) -> bool:
+        # False if nothing was released within the timeout; a release only
+        # means a retry may succeed, another request can take the slot first
+        if timeout <= 0:
+            return False
+        try:
+            await asyncio.wait_for(self._released.wait(), timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._inference_pool, partial(fn, *args))
+
+    async def decode(
+        self, image_bytes: bytes
+    ) -> tuple[Image.Image, tuple[float, float]]:
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(
+                self._decode_pool, decode_image, image_bytes
+            )
+        finally:
+            request_stage_histogram.observe(time.perf_counter() - start, stage="decode")
+
+    async def check_quality(
+        self, image: Image.Image, scale: tuple[float, float]
+    ) -> None:
+        # raises quality.ImageRejected; on the decode threads, numpy releases
+        # the GIL for most of it
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            await loop.run_in_executor(self._decode_pool, check_quality, image, scale)
+        finally:
+            request_stage_histogram.observe(
+                time.perf_counter() - start, stage="quality"
+            )
+
+    def shutdown(self) -> None:
+        self._inference_pool.shutdown(wait=True)
+        self._decode_pool.shutdown(wait=True)
+
+
+def _draft_size(width: int, height: int, target: int) -> tuple[int, int]:
+    # PIL keeps both sides at least this large, only the long side has to
+    # cover the model input since letterboxing shrinks the short one anyway
+    ratio = target / max(width, height)
+    return max(1, math.ceil(width * ratio)), max(1, math.ceil(height * ratio))
+
+
+@cache
+def _turbojpeg():
+    try:
+        from turbojpeg import TurboJPEG
+    except ImportError as e:
+        raise ImportError(
+            "RECOGNIZE_DECODER=turbojpeg requires PyTurboJPEG and libjpeg-turbo, "
+            "install with `uv sync --extra turbojpeg` (EXTRAS build arg of the image)"
+        ) from e
+    return TurboJPEG()
+
+
+def _decode_turbojpeg(
+    image_bytes: bytes, target: int
+) -> tuple[Image.Image, tuple[int, int]]:
+    from turbojpeg import TJPF_RGB
+
+    jpeg = _turbojpeg()
+    width, height, _, _ = jpeg.decode_header(image_bytes)
+    factor = (1, 1)
+    if target:
+        long_side = max(width, height)
+        fitting = [
+            (num, denom)
+            for num, denom in jpeg.scaling_factors
+            if num <= denom and math.ceil(long_side * num / denom) >= target
+        ]
+        factor = min(fitting, key=lambda f: f[0] / f[1], default=(1, 1))
+    array = jpeg.decode(image_bytes, pixel_format=TJPF_RGB, scaling_factor=factor)
+    return Image.fromarray(array), (width, height)
+
+
+def decode_image(
+    image_bytes: bytes, target: int = DECODE_SIZE, decoder: str = DECODER
+) -> tuple[Image.Image, tuple[float, float]]:
+    # returns the image and the factors that map its coordinates back to the
+    # original resolution
+    if decoder == "turbojpeg" and image_bytes.startswith(b"\xff\xd8\xff"):
+        image, original_size = _decode_turbojpeg(image_bytes, target)
+    else:
+        image = Image.open(io.BytesIO(image_bytes))
+        original_size = image.size
+        if target and image.format == "JPEG":
+            image.draft("RGB", _draft_size(*original_size, target))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        else:
+            image.load()
+    return image, (original_size[0] / image.width, original_size[1] / image.height)
+
+
+inference_executor = InferenceExecutor()
+in_flight_gauge = Gauge(
+    "recognize_in_flight_images",
+    "Images admitted and not yet replied to",
+    function=lambda: inference_executor.admitted,
+)
@@ -0,0 +1,40 @@
+from collections import defaultdict
+
+import numpy as np
+
+MATCH_IOU = 0.5
+
+
+def _iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    inter_w = np.clip(
+        np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0]), 0, None
+    )
+    inter_h = np.clip(
+        np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1]), 0, None
+    )
+    inter = inter_w * inter_h
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / ((box[2] - box[0]) * (box[3] - box[1]) + areas - inter + 1e-9)
+
+
+def match_detections(
+    reference: np.ndarray, candidate: np.ndarray, iou_threshold: float = MATCH_IOU
+) -> dict[int, dict[str, int]]:
+    # greedy matching of candidate boxes (most confident first) to unmatched
+    # reference boxes of the same class
+    counts: dict[int, dict[str, int]] = defaultdict(lambda: {"tp": 0, "fp": 0, "fn": 0})
+    matched = np.zeros(len(reference), dtype=bool)
+    for row in candidate[candidate[:, 4].argsort()[::-1]]:
+        class_id = int(row[5])
+        candidates = np.flatnonzero((reference[:, 5] == row[5]) & ~matched)
+        if len(candidates):
+            ious = _iou(row, reference[candidates])
+            best = ious.argmax()
+            if ious[best] >= iou_threshold:
+                matched[candidates[best]] = True
+                counts[class_id]["tp"] += 1
+                continue
+        counts[class_id]["fp"] += 1
+    for row in reference[~matched]:
+        counts[int(row[5])]["fn"] += 1
+    return counts
@@ -0,0 +1,183 @@
+import os
+import resource
+import threading
+from bisect import bisect_left
+from typing import Callable, Sequence
+
+REGISTRY: list["Counter | Gauge | Histogram"] = []
+
+
+def _label_key(labels: dict[str, str]) -> tuple[tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self._values: dict[tuple[tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "type": "counter",
+                "values": [
+                    {"labels": dict(key), "value": value}
+                    for key, value in self._values.items()
+                ],
+            }
+
+
+class Gauge:
+    # either set explicitly or read from function at collection time
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        function: Callable[[], float] | None = None,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self._function = function
+        self._values: dict[tuple[tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        if self._function is not None:
+            return float(self._function())
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def snapshot(self) -> dict:
+        if self._function is not None:
+            values = [{"labels": {}, "value": self.value()}]
+        else:
+            with self._lock:
+                values = [
+                    {"labels": dict(key), "value": value}
+                    for key, value in self._values.items()
+                ]
+        return {"type": "gauge", "values": values}
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._counts: dict[tuple[tuple[str, str], ...], list[int]] = {}
+        self._sums: dict[tuple[tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        # last slot is the implicit +Inf bucket
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            return sum(self._counts.get(_label_key(labels), ()))
+
+    def mean(self, **labels: str) -> float:
+        key = _label_key(labels)
+        with self._lock:
+            total = sum(self._counts.get(key, ()))
+            return self._sums.get(key, 0.0) / total if total else 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "type": "histogram",
+                "buckets": list(self.buckets),
+                "values": [
+                    {
+                        "labels": dict(key),
+                        "counts": list(counts),
+                        "count": sum(counts),
+                        "sum": self._sums[key],
+                    }
+                    for key, counts in self._counts.items()
+                ],
+            }
+
+
+def _resident_memory() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # peak instead of current where there is no procfs
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+resident_memory_gauge = Gauge(
+    "process_resident_memory_bytes",
+    "Resident memory of this process",
+    function=_resident_memory,
+)
+
+
+def snapshot() -> dict[str, dict]:
+    return {metric.name: metric.snapshot() for metric in REGISTRY}
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def render() -> str:
+    # Prometheus text exposition format 0.0.4
+    lines = []
+    for registered in REGISTRY:
+        name, metric = registered.name, registered.snapshot()
+        lines.append(f"# HELP {name} {registered.documentation}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for entry in metric["values"]:
+            labels = entry["labels"]
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {entry['value']}")
+                continue
+            cumulative = 0
+            bounds = [*metric["buckets"], "+Inf"]
+            for bound, count in zip(bounds, entry["counts"]):
+                cumulative += count
+                bucket = _format_labels({**labels, "le": bound})
+                lines.append(f"{name}_bucket{bucket} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {entry['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {entry['count']}")
+    return "\n".join(lines) + "\n"
@@ -1,46 +1,272 @@
 import os
+import time
+from functools import partial
+import numpy as np
 from PIL import Image
-from ultralytics import YOLO
-from .schemas import Detection, DetectionBBox
+from . import shadow as shadow_module
+from .backends import Backend, create_backend
+from .metrics import Counter, Histogram
+from .registry import REGISTRY_PATH, LoadedModel, ModelRegistry, RegistryState
+from .schemas import Detection, DetectionBBox, KitHints
 
 THRESHOLD = float(os.getenv("RECOGNIZE_THRESHOLD", "0.7"))
-model = None
+BACKEND = os.getenv("RECOGNIZE_BACKEND", "torch")
+WEIGHTS_PATH = os.getenv("RECOGNIZE_WEIGHTS_PATH", "model.pt")
+# explicit path to an exported .onnx file or OpenVINO IR directory; derived
+# from the weights path (and exported on first start) when empty
+BACKEND_MODEL_PATH = os.getenv("RECOGNIZE_BACKEND_MODEL_PATH") or None
+PRECISION = os.getenv("RECOGNIZE_PRECISION", "fp32")
+# two stage cascade: when set, this small model answers first and an image
+# only goes to the main model if a detection falls in the uncertainty band
+# or the counts disagree with the expected kit composition
+CASCADE_WEIGHTS_PATH = os.getenv("RECOGNIZE_CASCADE_WEIGHTS_PATH") or None
+CASCADE_LOW = float(os.getenv("RECOGNIZE_CASCADE_LOW", "0.5"))
+CASCADE_HIGH = float(os.getenv("RECOGNIZE_CASCADE_HIGH", "0.85"))
+CASCADE_STATS_EVERY = int(os.getenv("RECOGNIZE_CASCADE_STATS_EVERY", "100"))
+registry = ModelRegistry(
+    REGISTRY_PATH, WEIGHTS_PATH, BACKEND_MODEL_PATH, BACKEND, PRECISION
+)
+# swapped as a whole by activate, a batch keeps the model it started with
+active: LoadedModel | None = None
+shadow: LoadedModel | None = None
+shadow_sample = 0.0
+small_model: Backend | None = None
+class_names: np.ndarray | None = None
+# changes whenever different model weights are activated
+model_version: str | None = None
+
+cascade_images_counter = Counter(
+    "recognize_cascade_images_total",
+    "Images by the cascade stage that produced their result and the reason",
+)
+stage_latency_histogram = Histogram(
+    "recognize_stage_latency_seconds",
+    "Forward pass latency of one batch by cascade stage",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+cascade_latency_histogram = Histogram(
+    "recognize_cascade_latency_seconds",
+    "Recognize latency of an image by the cascade stage that resolved it",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+
+def _version(backend: Backend) -> str:
+    return f"{backend.path}@{os.stat(backend.path).st_mtime_ns}"
+
+
+def activate(state: RegistryState) -> None:
+    global active, shadow, shadow_sample, small_model, class_names, model_version
+    loaded = state.models[state.active]
+    names = loaded.backend.names
+    if class_names is not None and list(class_names) != [
+        names[i] for i in range(len(names))
+    ]:
+        raise ValueError(
+            f"Model {loaded.name} was trained on other classes than the served one"
+        )
+    if CASCADE_WEIGHTS_PATH and small_model is None:
+        small = create_backend(BACKEND, CASCADE_WEIGHTS_PATH, None, PRECISION)
+        if small.names != names:
+            raise ValueError(
+                f"Cascade model {small.path} was trained on other classes "
+                f"than {loaded.backend.path}"
+            )
+        small_model = small
+        print(f"Cascade model loaded from {small.path}")
+
+    registry.commit(state)
+    class_names = np.array([names[i] for i in range(len(names))], dtype=object)
+    shadow = state.models[state.shadow] if state.shadow else None
+    shadow_sample = state.shadow_sample
+    model_version = loaded.version
+    if small_model is not None:
+        model_version += f"+{_version(small_model)}"
+    previous, active = active, loaded
+    if previous is None or previous.version != loaded.version:
+        print(
+            f"Model {loaded.name} active, loaded from {loaded.backend.path} "
+            f"({loaded.version})"
+        )
+    if shadow is not None:
+        print(f"Model {shadow.name} runs in shadow on {shadow_sample:.0%} of batches")
 
 
 def load_model():
-    global model
-    if model is None:
-        model_path = "model.pt"
-        if not os.path.exists(model_path):
-            raise FileNotFoundError(f"Model file {model_path} not found")
-        model = YOLO(model_path)
-        print(f"YOLO model loaded successfully from {model_path}")
-    return model
-
-
-def recognize(image: Image.Image) -> list[Detection]:
-    if model is None:
+    if active is None:
+        state = registry.refresh()
+        assert state is not None
+        activate(state)
+    assert active is not None
+    return active.backend
+
+
+def _to_detections(data: np.ndarray, class_names: np.ndarray) -> list[Detection]:
+    # in float64 like the per box loop did, a float32 threshold would keep a
+    # confidence that only rounds up to it
+    data = data[data[:, 4].astype(np.float64) >= THRESHOLD]
+    if len(data) == 0:
+        return []
+
+    class_ids = data[:, 5].astype(np.int64)
+    names = class_names[class_ids]
+    coords = data[:, :4].tolist()
+    confidences = data[:, 4].tolist()
+    return [
+        Detection(
+            class_id=class_id,
+            class_name=class_name,
+            confidence=confidence,
+            bbox=DetectionBBox(x1=x1, y1=y1, x2=x2, y2=y2),
+        )
+        for (x1, y1, x2, y2), confidence, class_id, class_name in zip(
+            coords, confidences, class_ids.tolist(), names.tolist()
+        )
+    ]
+
+
+def escalation_reason(
+    data: np.ndarray, expected_counts: dict[int, int] | None = None
+) -> str | None:
+    confidences = data[:, 4]
+    if np.any((confidences >= CASCADE_LOW) & (confidences < CASCADE_HIGH)):
+        return "uncertain"
+    if expected_counts is not None:
+        class_ids, counts = np.unique(
+            data[confidences >= THRESHOLD, 5].astype(np.int64), return_counts=True
+        )
+        found = dict(zip(class_ids.tolist(), counts.tolist()))
+        expected = {
+            class_id: count for class_id, count in expected_counts.items() if count
+        }
+        if found != expected:
+            return "composition"
+    return None
+
+
+def _predict(
+    backend: Backend,
+    images: list[Image.Image],
+    conf: float,
+    hints: list[KitHints | None],
+) -> list[np.ndarray]:
+    # one forward pass for the batch, restricted to the union of the allowed
+    # classes; an image without a restriction keeps every class
+    allowed = [hint.allowed_classes if hint else None for hint in hints]
+    classes = (
+        sorted(set().union(*allowed))
+        if allowed and all(classes is not None for classes in allowed)
+        else None
+    )
+    results = backend.predict(images, conf=conf, classes=classes)
+    if len(images) == 1:
+        return results
+    return [
+        data[np.isin(data[:, 5], own)] if own is not None else data
+        for data, own in zip(results, allowed)
+    ]
+
+
+def _cascade_predict(
+    model: Backend, images: list[Image.Image], hints: list[KitHints | None]
+) -> list[np.ndarray]:
+    assert small_model is not None
+    start = time.perf_counter()
+    # the band may reach below the threshold, the small model has to report it
+    results = _predict(small_model, images, min(CASCADE_LOW, THRESHOLD), hints)
+    small_done = time.perf_counter()
+    stage_latency_histogram.observe(small_done - start, stage="small")
+
+    escalated = {}
+    for index, (data, hint) in enumerate(zip(results, hints)):
+        reason = escalation_reason(data, hint.expected_counts if hint else None)
+        if reason is None:
+            cascade_images_counter.inc(stage="small", reason="confident")
+            cascade_latency_histogram.observe(small_done - start, stage="small")
+        else:
+            escalated[index] = reason
+
+    if escalated:
+        large_results = _predict(
+            model,
+            [images[i] for i in escalated],
+            THRESHOLD,
+            [hints[i] for i in escalated],
+        )
+        done = time.perf_counter()
+        stage_latency_histogram.observe(done - small_done, stage="large")
+        for (index, reason), data in zip(escalated.items(), large_results):
+            results[index] = data
+            cascade_images_counter.inc(stage="large", reason=reason)
+            cascade_latency_histogram.observe(done - start, stage="large")
+
+    batches = stage_latency_histogram.count(stage="small")
+    if CASCADE_STATS_EVERY and batches % CASCADE_STATS_EVERY == 0:
+        resolved = cascade_latency_histogram.count(stage="small")
+        escalations = cascade_latency_histogram.count(stage="large")
+        reasons = ", ".join(
+            f"{reason} {int(cascade_images_counter.value(stage='large', reason=reason))}"
+            for reason in ("uncertain", "composition")
+        )
+        small_ms = cascade_latency_histogram.mean(stage="small") * 1000
+        large_ms = cascade_latency_histogram.mean(stage="large") * 1000
+        print(
+            f"Cascade: {resolved + escalations} images, escalated "
+            f"{escalations / (resolved + escalations):.0%} ({reasons}), "
+            f"latency {small_ms:.0f} ms small, {large_ms:.0f} ms escalated"
+        )
+    return results
+
+
+def recognize(image: Image.Image, hints: KitHints | None = None) -> list[Detection]:
+    return recognize_batch([image], [hints])[0]
+
+
+def recognize_batch(
+    images: list[Image.Image], hints: list[KitHints | None] | None = None
+) -> list[list[Detection]]:
+    current, candidate, names = active, shadow, class_names
+    if current is None or names is None:
         raise Exception("model is not loaded")
-    results = model(image)
-
-    detections = []
-    for result in results:
-        boxes = result.boxes
-        if boxes is not None:
-            for box in boxes:
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                confidence = float(box.conf[0].cpu().numpy())
-                if confidence >= THRESHOLD:
-                    class_id = int(box.cls[0].cpu().numpy())
-                    class_name = model.names[class_id]
-                    bbox = DetectionBBox(x1=x1, y1=y1, x2=x2, y2=y2)
-                    detections.append(
-                        Detection(
-                            class_id=class_id,
-                            class_name=class_name,
-                            confidence=confidence,
-                            bbox=bbox,
-                        )
-                    )
-
-    return detections
+    hints = hints or [None] * len(images)
+    start = time.perf_counter()
+    if small_model is not None:
+        results = _cascade_predict(current.backend, images, hints)
+    else:
+        results = _predict(current.backend, images, THRESHOLD, hints)
+        stage_latency_histogram.observe(time.perf_counter() - start, stage="large")
+    shadow_module.model_latency_histogram.observe(
+        time.perf_counter() - start, model=current.name, role="active"
+    )
+    if candidate is not None and candidate is not current:
+        shadow_module.sample(
+            current.name,
+            candidate.name,
+            shadow_sample,
+            partial(_predict, candidate.backend, images, THRESHOLD, hints),
+            results,
+            THRESHOLD,
+        )
+    return [_to_detections(result, names) for result in results]
+
+
+def rescale_detections(
+    detections: list[Detection], scale: tuple[float, float]
+) -> list[Detection]:
+    # maps boxes from a downscaled decode back to original image coordinates
+    scale_x, scale_y = scale
+    if scale_x == 1 and scale_y == 1:
+        return detections
+    return [
+        detection.model_copy(
+            update={
+                "bbox": DetectionBBox(
+                    x1=detection.bbox.x1 * scale_x,
+                    y1=detection.bbox.y1 * scale_y,
+                    x2=detection.bbox.x2 * scale_x,
+                    y2=detection.bbox.y2 * scale_y,
+                )
+            }
+        )
+        for detection in detections
+    ]
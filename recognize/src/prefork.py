@@ -0,0 +1,202 @@
+import gc
+import os
+import signal
+import socket
+import time
+from multiprocessing.sharedctypes import RawArray
+
+from .cpu_profile import pin_worker
+
+HTTP_WORKERS = os.getenv("RECOGNIZE_HTTP_WORKERS", "0")
+HTTP_PORT = int(os.getenv("RECOGNIZE_HTTP_PORT", "8000"))
+REPORT_INTERVAL_S = float(os.getenv("RECOGNIZE_REPORT_INTERVAL_S", "60"))
+RESTART_DELAY_S = 1.0
+
+
+def memory_usage(pid: int) -> tuple[float, float]:
+    # RSS counts shared weight pages in every worker, PSS splits them between
+    # the processes sharing them, so PSS is what an extra worker really costs
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    values[key] = int(rest.split()[0]) / 1024
+    except OSError:
+        return 0.0, 0.0
+    return values.get("Rss", 0.0), values.get("Pss", 0.0)
+
+
+def cpu_seconds(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # fields after the command name start at field 3, utime and
+            # stime are fields 14 and 15
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return 0.0
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class _RequestCounter:
+    def __init__(self, app, counts, index: int) -> None:
+        self.app = app
+        self._counts = counts
+        self._index = index
+
+    async def __call__(self, scope, receive, send) -> None:
+        # each worker only writes its own slot, the parent reads all of them;
+        # a /detect/batch request or a /detect/stream connection counts once
+        if scope["type"] != "lifespan" and scope["path"].startswith("/detect"):
+            self._counts[self._index] += 1
+        await self.app(scope, receive, send)
+
+
+class PreforkServer:
+    def __init__(self, workers: int, threads: int, port: int = HTTP_PORT) -> None:
+        self.workers = workers
+        self.threads = threads
+        self.port = port
+        self._pids: list[int | None] = [None] * workers
+        self._restart_at = [0.0] * workers
+        self._counts = RawArray("Q", workers)
+        self._last_counts = [0] * workers
+        self._last_cpu = [0.0] * workers
+        self._socket: socket.socket | None = None
+        self._stopping = False
+
+    def _preload(self):
+        from .supervisor import pin_threads
+
+        # before torch is imported, every worker inherits the bounded pools
+        pin_threads(self.threads)
+        from . import web_app
+        from .model import BACKEND, load_model
+
+        # torch only starts its thread pools on the first forward pass, so a
+        # model loaded here is shared copy-on-write by all forked workers.
+        # onnxruntime and OpenVINO start threads while loading, which do not
+        # survive a fork, so those workers load their own copy
+        if BACKEND == "torch":
+            start = time.perf_counter()
+            load_model()
+            print(f"Model loaded in parent in {time.perf_counter() - start:.1f}s")
+        # warmup runs in each worker after the fork, see startup.start
+        return web_app.app
+
+    def _serve(self, app, index: int) -> None:
+        import uvicorn
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        pin_worker(index, self.threads)
+        config = uvicorn.Config(
+            _RequestCounter(app, self._counts, index), lifespan="on", access_log=False
+        )
+        uvicorn.Server(config).run(sockets=[self._socket])
+
+    def _fork(self, app, index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._serve(app, index)
+            except BaseException as e:
+                print(f"HTTP worker {index} failed: {e!r}")
+                code = 1
+            finally:
+                os._exit(code)
+        self._pids[index] = pid
+        self._last_counts[index] = self._counts[index]
+        self._last_cpu[index] = 0.0
+        print(f"Forked HTTP worker {index} (pid {pid}, {self.threads} threads)")
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self._pids:
+                index = self._pids.index(pid)
+                self._pids[index] = None
+                self._restart_at[index] = time.monotonic() + RESTART_DELAY_S
+                print(
+                    f"HTTP worker {index} (pid {pid}) exited with code "
+                    f"{os.waitstatus_to_exitcode(status)}, restarting"
+                )
+
+    def report(self, interval: float) -> None:
+        total_requests = 0
+        total_cpu = 0.0
+        total_pss = memory_usage(os.getpid())[1]
+        for index, pid in enumerate(self._pids):
+            if pid is None:
+                continue
+            rss, pss = memory_usage(pid)
+            cpu = cpu_seconds(pid)
+            requests = self._counts[index] - self._last_counts[index]
+            busy = cpu - self._last_cpu[index]
+            self._last_counts[index] = self._counts[index]
+            self._last_cpu[index] = cpu
+            total_requests += requests
+            total_cpu += busy
+            total_pss += pss
+            print(
+                f"HTTP worker {index}: rss {rss:.0f} MB, pss {pss:.0f} MB, "
+                f"{requests / interval:.2f} rps, "
+                f"{requests / busy if busy else 0:.2f} requests per cpu second"
+            )
+        cores = len(os.sched_getaffinity(0))
+        print(
+            f"HTTP pool: {total_requests / interval:.2f} rps, "
+            f"{total_requests / interval / cores:.2f} rps per core ({cores} cores), "
+            f"{total_requests / total_cpu if total_cpu else 0:.2f} requests per cpu second, "
+            f"pss {total_pss:.0f} MB including parent"
+        )
+
+    def _stop(self, *_) -> None:
+        self._stopping = True
+
+    def run(self) -> None:
+        app = self._preload()
+        self._socket = socket.create_server(("0.0.0.0", self.port), backlog=2048)
+        # objects allocated so far stay in the permanent generation, the
+        # collector never writes to their pages and breaks their sharing
+        gc.collect()
+        gc.freeze()
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        print(f"Serving on port {self.port} with {self.workers} forked workers")
+        for index in range(self.workers):
+            self._fork(app, index)
+
+        last_report = time.monotonic()
+        while not self._stopping:
+            self._reap()
+            now = time.monotonic()
+            for index, pid in enumerate(self._pids):
+                if (
+                    pid is None
+                    and now >= self._restart_at[index]
+                    and not self._stopping
+                ):
+                    self._fork(app, index)
+            if REPORT_INTERVAL_S and now - last_report >= REPORT_INTERVAL_S:
+                self.report(now - last_report)
+                last_report = now
+            time.sleep(0.5)
+
+        for pid in self._pids:
+            if pid is not None:
+                os.kill(pid, signal.SIGTERM)
+        for pid in self._pids:
+            if pid is not None:
+                try:
+                    os.waitpid(pid, 0)
+                except ChildProcessError:
+                    pass
@@ -0,0 +1,127 @@
+import argparse
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+from .metrics import Counter
+
+# cheap checks that turn away photos the storekeeper has to retake anyway,
+# before they cost a forward pass; a threshold of 0 disables its check.
+# Shortest side of the original photo, in pixels
+QUALITY_MIN_SIDE = int(os.getenv("RECOGNIZE_QUALITY_MIN_SIDE", "320"))
+# share of pixels that are black (< 16) or white (> 239) above which a photo
+# is under or overexposed
+QUALITY_MAX_CLIPPED = float(os.getenv("RECOGNIZE_QUALITY_MAX_CLIPPED", "0.95"))
+# variance of the Laplacian of the photo downscaled to 256 px, below which it
+# is too blurry; calibrate it on real photos with python -m src.quality
+QUALITY_MIN_SHARPNESS = float(os.getenv("RECOGNIZE_QUALITY_MIN_SHARPNESS", "10"))
+_ANALYSIS_SIZE = 256
+
+quality_images_counter = Counter(
+    "recognize_quality_images_total",
+    "Images by quality check result: passed or the reason they were rejected",
+)
+
+
+@dataclass
+class QualityReport:
+    short_side: int
+    dark: float
+    bright: float
+    sharpness: float
+    reason: str | None = None
+
+
+class ImageRejected(Exception):
+    def __init__(self, report: QualityReport) -> None:
+        super().__init__(f"Image rejected as {report.reason}")
+        self.report = report
+        self.reason = report.reason
+
+
+def assess(
+    image: Image.Image,
+    scale: tuple[float, float] = (1.0, 1.0),
+    min_side: int = QUALITY_MIN_SIDE,
+    max_clipped: float = QUALITY_MAX_CLIPPED,
+    min_sharpness: float = QUALITY_MIN_SHARPNESS,
+) -> QualityReport:
+    # image as decoded, scale maps it back to the original resolution
+    short_side = round(min(image.width * scale[0], image.height * scale[1]))
+    # box filter first, it is several times cheaper than resampling the whole
+    # photo; a fixed analysis size keeps sharpness comparable across inputs
+    small = image.reduce(max(1, max(image.size) // _ANALYSIS_SIZE)).convert("L")
+    ratio = _ANALYSIS_SIZE / max(small.size)
+    if ratio < 1:
+        small = small.resize(
+            (round(small.width * ratio), round(small.height * ratio)),
+            Image.Resampling.BILINEAR,
+        )
+    pixels = np.asarray(small)
+    histogram = np.bincount(pixels.ravel(), minlength=256) / pixels.size
+    gray = pixels.astype(np.float32)
+    laplacian = (
+        4 * gray[1:-1, 1:-1]
+        - gray[:-2, 1:-1]
+        - gray[2:, 1:-1]
+        - gray[1:-1, :-2]
+        - gray[1:-1, 2:]
+    )
+    report = QualityReport(
+        short_side=short_side,
+        dark=float(histogram[:16].sum()),
+        bright=float(histogram[240:].sum()),
+        sharpness=float(laplacian.var()),
+    )
+    # exposure before blur: a black frame has no edges either
+    if min_side and short_side < min_side:
+        report.reason = "low_resolution"
+    elif max_clipped and report.dark > max_clipped:
+        report.reason = "underexposed"
+    elif max_clipped and report.bright > max_clipped:
+        report.reason = "overexposed"
+    elif min_sharpness and report.sharpness < min_sharpness:
+        report.reason = "blurry"
+    return report
+
+
+def check(image: Image.Image, scale: tuple[float, float] = (1.0, 1.0)) -> None:
+    report = assess(image, scale)
+    quality_images_counter.inc(result=report.reason or "passed")
+    if report.reason is not None:
+        raise ImageRejected(report)
+
+
+def main(argv: list[str] | None = None) -> int:
+    from .executor import decode_image
+    from .quantize import image_paths
+
+    parser = argparse.ArgumentParser(
+        prog="python -m src.quality",
+        description="Print the quality scores of photos with the configured "
+        "thresholds, to calibrate them on real photos.",
+    )
+    parser.add_argument("images", help="directory of photos")
+    args = parser.parse_args(argv)
+
+    print(f"{'image':<40}{'side':>6}{'dark':>7}{'bright':>7}{'sharp':>9}  result")
+    rejected = 0
+    for path in image_paths(args.images):
+        with open(path, "rb") as f:
+            image, scale = decode_image(f.read())
+        report = assess(image, scale)
+        rejected += report.reason is not None
+        print(
+            f"{path.name[:39]:<40}{report.short_side:>6}{report.dark:>7.2f}"
+            f"{report.bright:>7.2f}{report.sharpness:>9.1f}  "
+            f"{report.reason or 'passed'}"
+        )
+    print(f"{rejected} rejected")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from .backends import (
+    IMGSZ,
+    OnnxBackend,
+    create_backend,
+    int8_path,
+    letterbox,
+    to_input_tensor,
+)
+from .matching import match_detections
+from .model import THRESHOLD, WEIGHTS_PATH
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+TOLERANCE = float(os.getenv("RECOGNIZE_INT8_TOLERANCE", "0.02"))
+
+
+def image_paths(directory: str) -> list[Path]:
+    paths = sorted(
+        path
+        for path in Path(directory).rglob("*")
+        if path.suffix.lower() in IMAGE_SUFFIXES
+    )
+    if not paths:
+        raise FileNotFoundError(f"No images found in {directory}")
+    return paths
+
+
+def _load(path: Path) -> Image.Image:
+    return Image.open(path).convert("RGB")
+
+
+def _calibration_reader(input_name: str, paths: list[Path]):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class ImageFolderReader(CalibrationDataReader):
+        def __init__(self) -> None:
+            self._paths = iter(paths)
+
+        def get_next(self) -> dict[str, np.ndarray] | None:
+            path = next(self._paths, None)
+            if path is None:
+                return None
+            canvas, _, _ = letterbox(_load(path), IMGSZ)
+            return {input_name: to_input_tensor([canvas])}
+
+    return ImageFolderReader()
+
+
+def _head_nodes_to_exclude(model_path: str) -> list[str]:
+    import onnx
+
+    graph = onnx.load(model_path, load_external_data=False).graph
+    # ultralytics names nodes /model.<layer index>/...; the detect head is the
+    # last layer and its box decoding (DFL, concat, sigmoid) loses too much
+    # precision in int8, so only its convolutions are quantized
+    layers = [
+        int(match.group(1))
+        for node in graph.node
+        if (match := re.match(r"/model\.(\d+)/", node.name))
+    ]
+    if not layers:
+        return []
+    head_prefix = f"/model.{max(layers)}/"
+    return [
+        node.name
+        for node in graph.node
+        if node.name.startswith(head_prefix) and node.op_type != "Conv"
+    ]
+
+
+def quantize(fp32_path: str, output_path: str, calibration_paths: list[Path]) -> None:
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    input_name = (
+        ort.InferenceSession(fp32_path, providers=["CPUExecutionProvider"])
+        .get_inputs()[0]
+        .name
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        preprocessed = os.path.join(tmp, "preprocessed.onnx")
+        # symbolic inference cannot resolve the dynamic batch and image axes
+        quant_pre_process(fp32_path, preprocessed, skip_symbolic_shape=True)
+        quantize_static(
+            preprocessed,
+            output_path,
+            _calibration_reader(input_name, calibration_paths),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            nodes_to_exclude=_head_nodes_to_exclude(preprocessed),
+        )
+
+    # keep the class names so the onnx backend can serve the quantized file
+    import onnx
+
+    fp32_metadata = onnx.load(fp32_path, load_external_data=False).metadata_props
+    quantized = onnx.load(output_path)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(fp32_metadata)
+    onnx.save(quantized, output_path)
+
+
+def _timed_predict(
+    backend, images: list[Image.Image]
+) -> tuple[list[np.ndarray], list[float]]:
+    outputs, latencies = [], []
+    for image in images:
+        start = time.perf_counter()
+        outputs.extend(backend.predict([image], conf=THRESHOLD))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return outputs, latencies
+
+
+def _latency_summary(latencies: list[float]) -> dict[str, float]:
+    return {
+        "mean_ms": float(np.mean(latencies)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def evaluate(
+    reference_backend, candidate_backend, images: list[Image.Image], tolerance: float
+) -> dict:
+    # warm both sessions so the first call does not skew latency
+    reference_backend.predict(images[:1], conf=THRESHOLD)
+    candidate_backend.predict(images[:1], conf=THRESHOLD)
+    reference, reference_latency = _timed_predict(reference_backend, images)
+    candidate, candidate_latency = _timed_predict(candidate_backend, images)
+
+    totals: dict[int, dict[str, int]] = defaultdict(lambda: {"tp": 0, "fp": 0, "fn": 0})
+    for expected, result in zip(reference, candidate):
+        for class_id, counts in match_detections(expected, result).items():
+            for key, value in counts.items():
+                totals[class_id][key] += value
+
+    classes = {}
+    for class_id, counts in sorted(totals.items()):
+        tp, fp, fn = counts["tp"], counts["fp"], counts["fn"]
+        precision = tp / (tp + fp) if tp + fp else 1.0
+        recall = tp / (tp + fn) if tp + fn else 1.0
+        classes[reference_backend.names[class_id]] = {
+            "support": tp + fn,
+            "precision": precision,
+            "recall": recall,
+            "passed": precision >= 1 - tolerance and recall >= 1 - tolerance,
+        }
+
+    fp32_latency = _latency_summary(reference_latency)
+    int8_latency = _latency_summary(candidate_latency)
+    return {
+        "images": len(images),
+        "threshold": THRESHOLD,
+        "tolerance": tolerance,
+        "classes": classes,
+        "latency": {
+            "fp32": fp32_latency,
+            "int8": int8_latency,
+            "speedup": fp32_latency["mean_ms"] / int8_latency["mean_ms"],
+        },
+        "passed": all(report["passed"] for report in classes.values()),
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"{'class':<24}{'support':>8}{'precision':>11}{'recall':>8}")
+    for name, stats in report["classes"].items():
+        flag = "" if stats["passed"] else "  <- regressed"
+        print(
+            f"{name:<24}{stats['support']:>8}"
+            f"{stats['precision']:>11.3f}{stats['recall']:>8.3f}{flag}"
+        )
+    latency = report["latency"]
+    for precision in ("fp32", "int8"):
+        print(
+            f"{precision}: mean {latency[precision]['mean_ms']:.1f} ms, "
+            f"p50 {latency[precision]['p50_ms']:.1f} ms, "
+            f"p95 {latency[precision]['p95_ms']:.1f} ms"
+        )
+    print(f"speedup: {latency['speedup']:.2f}x")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.quantize",
+        description="Build an INT8 model from tray photos and activate it if it "
+        "stays within the accuracy tolerance of the FP32 model.",
+    )
+    parser.add_argument("--calibration-dir", required=True)
+    parser.add_argument(
+        "--eval-dir", help="held-out photos for the gate, defaults to calibration dir"
+    )
+    parser.add_argument("--weights", default=WEIGHTS_PATH)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--calibration-limit", type=int, default=200)
+    parser.add_argument("--report", help="write the evaluation report as JSON")
+    args = parser.parse_args(argv)
+
+    reference_backend = create_backend("onnx", args.weights)
+    active_path = int8_path(args.weights)
+    candidate_path = active_path.removesuffix(".onnx") + ".candidate.onnx"
+
+    calibration_paths = image_paths(args.calibration_dir)[: args.calibration_limit]
+    print(f"Calibrating on {len(calibration_paths)} images")
+    quantize(reference_backend.path, candidate_path, calibration_paths)
+
+    eval_images = [
+        _load(path) for path in image_paths(args.eval_dir or args.calibration_dir)
+    ]
+    report = evaluate(
+        reference_backend, OnnxBackend(candidate_path), eval_images, args.tolerance
+    )
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if not report["passed"]:
+        print(
+            f"INT8 model regressed beyond tolerance {args.tolerance}, "
+            f"not activating; candidate left at {candidate_path}"
+        )
+        return 1
+    os.replace(candidate_path, active_path)
+    print(
+        f"INT8 model activated at {active_path}, serve it with RECOGNIZE_PRECISION=int8"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import json
+import os
+from dataclasses import dataclass, field
+
+from .backends import Backend, create_backend
+
+# JSON file with the named models this process keeps loaded, which one serves
+# and which one runs in shadow, e.g.
+#   {"models": {"m-2024-06": "models/m.pt",
+#               "n-candidate": {"weights": "models/n.pt", "backend": "onnx"}},
+#    "active": "m-2024-06", "shadow": "n-candidate", "shadow_sample": 0.05}
+# Without it the registry holds RECOGNIZE_WEIGHTS_PATH as the only model
+REGISTRY_PATH = os.getenv("RECOGNIZE_REGISTRY_PATH") or None
+# how often the file and the weights it points to are checked for changes,
+# 0 disables hot reload
+REGISTRY_POLL_S = float(os.getenv("RECOGNIZE_REGISTRY_POLL_S", "10"))
+DEFAULT_MODEL = "default"
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    name: str
+    backend: Backend
+    # changes whenever different weights are loaded under this name
+    version: str
+
+
+@dataclass
+class RegistryState:
+    models: dict[str, LoadedModel]
+    active: str
+    shadow: str | None = None
+    shadow_sample: float = 0.0
+    # loaded by this refresh and not warmed up yet
+    fresh: list[LoadedModel] = field(default_factory=list)
+
+
+def _file_version(path: str) -> str:
+    try:
+        return f"{path}@{os.stat(path).st_mtime_ns}"
+    except OSError:
+        return f"{path}@missing"
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        path: str | None,
+        default_weights: str,
+        default_model_path: str | None,
+        backend: str,
+        precision: str,
+    ) -> None:
+        self.path = path
+        self._default = {"weights": default_weights, "path": default_model_path}
+        self._backend = backend
+        self._precision = precision
+        self.models: dict[str, LoadedModel] = {}
+        self._signature: tuple | None = None
+
+    def _read(self) -> dict:
+        if self.path is None:
+            return {"models": {DEFAULT_MODEL: self._default}, "active": DEFAULT_MODEL}
+        with open(self.path) as f:
+            config = json.load(f)
+        config["models"] = {
+            name: {"weights": spec} if isinstance(spec, str) else spec
+            for name, spec in config["models"].items()
+        }
+        if config.get("active") not in config["models"]:
+            raise ValueError(f"Active model {config.get('active')} is not registered")
+        if config.get("shadow") not in (None, *config["models"]):
+            raise ValueError(f"Shadow model {config['shadow']} is not registered")
+        if not 0 <= config.get("shadow_sample", 0.0) <= 1:
+            raise ValueError("shadow_sample must be between 0 and 1")
+        return config
+
+    def _version(self, name: str, spec: dict) -> str:
+        # an explicit exported model is what actually gets served, otherwise
+        # the weights it is exported from
+        return f"{name}:{_file_version(spec.get('path') or spec['weights'])}"
+
+    def refresh(self) -> RegistryState | None:
+        # None while neither the file nor any registered weights changed; a
+        # broken change is reported once and retried when the files change
+        file_version = _file_version(self.path) if self.path else None
+        if self._signature == (file_version, None):
+            return None
+        try:
+            config = self._read()
+        except Exception:
+            self._signature = (file_version, None)
+            raise
+        versions = {
+            name: self._version(name, spec) for name, spec in config["models"].items()
+        }
+        signature = (file_version, tuple(sorted(versions.items())))
+        if signature == self._signature:
+            return None
+        self._signature = signature
+
+        state = RegistryState(
+            models={},
+            active=config["active"],
+            shadow=config.get("shadow"),
+            shadow_sample=float(config.get("shadow_sample", 0.0)),
+        )
+        for name, spec in config["models"].items():
+            loaded = self.models.get(name)
+            if loaded is None or loaded.version != versions[name]:
+                backend = create_backend(
+                    spec.get("backend", self._backend),
+                    spec["weights"],
+                    spec.get("path"),
+                    spec.get("precision", self._precision),
+                )
+                loaded = LoadedModel(name, backend, versions[name])
+                state.fresh.append(loaded)
+            state.models[name] = loaded
+
+        # class ids are shared with the API tool mapping, every registered
+        # model has to be trained on the same classes
+        names = state.models[state.active].backend.names
+        for loaded in state.models.values():
+            if loaded.backend.names != names:
+                raise ValueError(
+                    f"Model {loaded.name} was trained on other classes than "
+                    f"{state.active}"
+                )
+        return state
+
+    def commit(self, state: RegistryState) -> None:
+        self.models = state.models
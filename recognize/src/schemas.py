@@ -1,3 +1,5 @@
+import json
+
 from pydantic import BaseModel
 
 
@@ -19,7 +21,59 @@ class DetectResponse(BaseModel):
     success: bool = True
     detections: list[Detection]
     total_detections: int
+    error: str | None = None
+    # with error ImageRejected: low_resolution, underexposed, overexposed or
+    # blurry, the photo has to be retaken
+    reject_reason: str | None = None
+
+
+class KitHints(BaseModel):
+    # model class id -> quantity in the kit on the tray, if known
+    expected_counts: dict[int, int] | None = None
+    # model class ids that can be on the tray, detections of others are
+    # pruned inside the model
+    allowed_classes: list[int] | None = None
+
+    def cache_key(self) -> tuple:
+        return (
+            frozenset(self.expected_counts.items()) if self.expected_counts else None,
+            frozenset(self.allowed_classes)
+            if self.allowed_classes is not None
+            else None,
+        )
+
+
+class DetectRequest(KitHints):
+    # base64 photo, or empty when image_key names it in the S3 bucket
+    image_bytes: str = ""
+    image_key: str | None = None
+
+
+class DetectStreamFrame(DetectResponse):
+    frame: int
+    stable_counts: dict[str, int]
+    latency_ms: float
+    received: int
+    dropped: int
+    unchanged: int
+    drop_rate: float
+
+
+def kit_hints(
+    expected_counts: dict[int, int] | None = None,
+    allowed_classes: list[int] | None = None,
+) -> KitHints | None:
+    if expected_counts is None and allowed_classes is None:
+        return None
+    return KitHints(expected_counts=expected_counts, allowed_classes=allowed_classes)
 
 
-class DetectRequest(BaseModel):
-    image_bytes: str
+def parse_kit_hints(
+    expected_counts: str | None = None, allowed_classes: str | None = None
+) -> KitHints | None:
+    # JSON values as sent in headers and forms: an object of model class
+    # id -> quantity and a list of model class ids
+    return kit_hints(
+        json.loads(expected_counts) if expected_counts else None,
+        json.loads(allowed_classes) if allowed_classes else None,
+    )
@@ -0,0 +1,116 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import numpy as np
+
+from .matching import match_detections
+from .metrics import Counter, Histogram
+
+SHADOW_STATS_EVERY = int(os.getenv("RECOGNIZE_SHADOW_STATS_EVERY", "100"))
+
+model_latency_histogram = Histogram(
+    "recognize_model_latency_seconds",
+    "Recognize latency of one batch by model and role: active or shadow",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+shadow_images_counter = Counter(
+    "recognize_shadow_images_total",
+    "Sampled images by shadow outcome: agree or disagree on the per class "
+    "counts, skipped (shadow busy) or failed",
+)
+shadow_boxes_counter = Counter(
+    "recognize_shadow_boxes_total",
+    "Shadow detections matched to the active ones: tp, fp (shadow only) or "
+    "fn (active only)",
+)
+
+# one shadow batch at a time on its own thread: the shadow never delays a
+# reply, and a sample that arrives while it is busy is skipped, not queued
+_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+_busy = threading.Lock()
+
+
+def _class_counts(data: np.ndarray) -> dict[int, int]:
+    class_ids, counts = np.unique(data[:, 5].astype(np.int64), return_counts=True)
+    return dict(zip(class_ids.tolist(), counts.tolist()))
+
+
+def compare(
+    reference: np.ndarray, candidate: np.ndarray
+) -> tuple[bool, dict[str, int]]:
+    # the tool counts are what the API acts on, boxes tell how close it is
+    totals = {"tp": 0, "fp": 0, "fn": 0}
+    for counts in match_detections(reference, candidate).values():
+        for key, value in counts.items():
+            totals[key] += value
+    return _class_counts(reference) == _class_counts(candidate), totals
+
+
+def sample(
+    active: str,
+    shadow: str,
+    rate: float,
+    predict: Callable[[], list[np.ndarray]],
+    reference: list[np.ndarray],
+    threshold: float,
+) -> None:
+    if rate <= 0 or random.random() >= rate:
+        return
+    if not _busy.acquire(blocking=False):
+        shadow_images_counter.inc(len(reference), model=shadow, result="skipped")
+        return
+    _pool.submit(_run, active, shadow, predict, reference, threshold)
+
+
+def _run(
+    active: str,
+    shadow: str,
+    predict: Callable[[], list[np.ndarray]],
+    reference: list[np.ndarray],
+    threshold: float,
+) -> None:
+    try:
+        start = time.perf_counter()
+        results = predict()
+        model_latency_histogram.observe(
+            time.perf_counter() - start, model=shadow, role="shadow"
+        )
+        for expected, result in zip(reference, results):
+            # cascade results can hold detections below the threshold
+            agree, totals = compare(expected[expected[:, 4] >= threshold], result)
+            shadow_images_counter.inc(
+                model=shadow, result="agree" if agree else "disagree"
+            )
+            for outcome, value in totals.items():
+                shadow_boxes_counter.inc(value, model=shadow, outcome=outcome)
+    except Exception as e:
+        print(f"Shadow model {shadow} failed: {e!r}")
+        shadow_images_counter.inc(len(reference), model=shadow, result="failed")
+    finally:
+        _busy.release()
+
+    batches = model_latency_histogram.count(model=shadow, role="shadow")
+    if SHADOW_STATS_EVERY and batches % SHADOW_STATS_EVERY == 0:
+        print_stats(active, shadow)
+
+
+def print_stats(active: str, shadow: str) -> None:
+    agree = shadow_images_counter.value(model=shadow, result="agree")
+    disagree = shadow_images_counter.value(model=shadow, result="disagree")
+    tp, fp, fn = (
+        shadow_boxes_counter.value(model=shadow, outcome=outcome)
+        for outcome in ("tp", "fp", "fn")
+    )
+    active_ms = model_latency_histogram.mean(model=active, role="active") * 1000
+    shadow_ms = model_latency_histogram.mean(model=shadow, role="shadow") * 1000
+    print(
+        f"Shadow {shadow}: {agree + disagree:.0f} images, counts agree on "
+        f"{agree / (agree + disagree) if agree + disagree else 0:.1%}, "
+        f"box precision {tp / (tp + fp) if tp + fp else 1:.3f} "
+        f"recall {tp / (tp + fn) if tp + fn else 1:.3f}, latency per batch "
+        f"{shadow_ms:.0f} ms vs {active_ms:.0f} ms for {active}"
+    )
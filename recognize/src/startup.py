@@ -0,0 +1,160 @@
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable
+
+from PIL import Image
+
+from . import metrics
+from . import model as model_module
+from .backends import IMGSZ
+from .executor import inference_executor
+from .model import THRESHOLD, activate, load_model, recognize_batch
+from .registry import REGISTRY_POLL_S
+
+# comma separated WxH (or a single number for square) photo sizes pushed
+# through the model once before the service reports ready
+WARMUP_SIZES = os.getenv("RECOGNIZE_WARMUP_SIZES", str(IMGSZ))
+WARMUP_RUNS = int(os.getenv("RECOGNIZE_WARMUP_RUNS", "1"))
+# the amqp worker serves /livez, /readyz and /metrics here, 0 disables it
+HEALTH_PORT = int(os.getenv("RECOGNIZE_HEALTH_PORT", "8000"))
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+phases: dict[str, float] = {}
+live = True
+ready = False
+_watcher: asyncio.Task | None = None
+
+
+@contextmanager
+def phase(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = time.perf_counter() - start
+        print(f"Startup phase {name}: {phases[name] * 1000:.0f} ms")
+
+
+def parse_sizes(value: str) -> list[tuple[int, int]]:
+    sizes = []
+    for item in value.split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        width, _, height = item.partition("x")
+        sizes.append((int(width), int(height or width)))
+    return sizes
+
+
+async def warmup(
+    sizes: list[tuple[int, int]],
+    batch_sizes: tuple[int, ...] = (1,),
+    predict: Callable[[list[Image.Image]], object] = recognize_batch,
+) -> None:
+    # runs on the inference pool: the torch backend binds its model to the
+    # first thread that predicts, and the first passes allocate and pick kernels
+    for width, height in sizes:
+        image = Image.new("RGB", (width, height), (114, 114, 114))
+        for batch_size in sorted(set(batch_sizes)):
+            for _ in range(WARMUP_RUNS):
+                await inference_executor.run(predict, [image] * batch_size)
+
+
+async def watch_registry(
+    batch_sizes: tuple[int, ...] = (1,), interval: float = REGISTRY_POLL_S
+) -> None:
+    # hot reload: new or changed models are loaded and warmed next to the
+    # serving one, which keeps answering until the swap
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            state = await asyncio.to_thread(model_module.registry.refresh)
+            if state is None:
+                continue
+            for loaded in state.fresh:
+                start = time.perf_counter()
+                await warmup(
+                    parse_sizes(WARMUP_SIZES),
+                    batch_sizes,
+                    partial(loaded.backend.predict, conf=THRESHOLD),
+                )
+                print(
+                    f"Model {loaded.name} ({loaded.version}) warmed up in "
+                    f"{(time.perf_counter() - start) * 1000:.0f} ms"
+                )
+            activate(state)
+        except Exception as e:
+            current = model_module.active
+            print(
+                f"Model registry reload failed, still serving "
+                f"{current.name if current else None}: {e!r}"
+            )
+
+
+async def start(batch_sizes: tuple[int, ...] = (1,)) -> None:
+    global live, ready, _watcher
+    try:
+        with phase("model load"):
+            await asyncio.to_thread(load_model)
+        with phase("warmup"):
+            await warmup(parse_sizes(WARMUP_SIZES), batch_sizes)
+    except Exception:
+        live = False
+        raise
+    ready = True
+    print(f"Ready after {sum(phases.values()) * 1000:.0f} ms of startup")
+    if REGISTRY_POLL_S:
+        _watcher = asyncio.create_task(watch_registry(batch_sizes))
+
+
+def stop() -> None:
+    global ready
+    ready = False
+    if _watcher is not None:
+        _watcher.cancel()
+
+
+def _probe(path: str) -> int:
+    # liveness: the process is not broken, restart it otherwise
+    # readiness: the model is loaded and warm, send it work
+    if path == "/livez":
+        return 200 if live else 503
+    if path == "/readyz":
+        return 200 if live and ready else 503
+    return 404
+
+
+async def _handle_probe(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    try:
+        request_line = await reader.readline()
+        parts = request_line.decode("latin-1").split()
+        path = parts[1] if len(parts) > 1 else ""
+        content_type = "text/plain"
+        if path == "/metrics":
+            status, body = 200, metrics.render().encode()
+            content_type = METRICS_CONTENT_TYPE
+        else:
+            status = _probe(path)
+            body = b"ok" if status == 200 else b"not ok"
+        reason = {200: "OK", 404: "Not Found", 503: "Service Unavailable"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1")
+            + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve_health(port: int = HEALTH_PORT) -> asyncio.Server | None:
+    # a bare HTTP responder, the amqp worker has no web framework loaded
+    if not port:
+        return None
+    return await asyncio.start_server(_handle_probe, "0.0.0.0", port)
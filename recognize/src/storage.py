@@ -0,0 +1,78 @@
+import asyncio
+import os
+import time
+from contextlib import AsyncExitStack
+
+from .executor import request_stage_histogram
+
+# claim check: the API can upload a photo to S3 compatible storage and send
+# only its key, the worker fetches it from the same bucket. Same settings as
+# the API
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "http://minio:9000")
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY", "minioadmin")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY", "minioadmin")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_BUCKET = os.getenv("S3_BUCKET", "files")
+# connections kept open to the storage, at least the prefetch so every
+# message the broker hands out can be fetched at once
+S3_POOL_SIZE = int(os.getenv("RECOGNIZE_S3_POOL_SIZE", "32"))
+# the API's setting: when on, messages carry keys instead of images and the
+# worker must be able to fetch them before it starts consuming
+_TRUE = ("1", "true", "yes", "on")
+CLAIM_CHECK = os.getenv("RECOGNIZE_CLAIM_CHECK", "false").lower() in _TRUE
+
+
+class ImageStore:
+    # one client for the life of the process: its connection pool is reused,
+    # a client per request would pay the TLS and auth setup every time
+    def __init__(self, bucket: str = S3_BUCKET, pool_size: int = S3_POOL_SIZE):
+        self.bucket = bucket
+        self.pool_size = pool_size
+        self._client = None
+        self._stack: AsyncExitStack | None = None
+        self._lock = asyncio.Lock()
+
+    async def open(self):
+        async with self._lock:
+            if self._client is None:
+                # optional dependency, only claim check deployments need it
+                try:
+                    import aioboto3
+                    from botocore.config import Config
+                except ImportError as e:
+                    raise ImportError(
+                        "Claim check requires aioboto3, install with "
+                        "`uv sync --extra s3` (EXTRAS build arg of the image)"
+                    ) from e
+
+                stack = AsyncExitStack()
+                self._client = await stack.enter_async_context(
+                    aioboto3.Session().client(
+                        "s3",
+                        endpoint_url=S3_ENDPOINT_URL,
+                        aws_access_key_id=S3_ACCESS_KEY,
+                        aws_secret_access_key=S3_SECRET_KEY,
+                        region_name=S3_REGION,
+                        config=Config(max_pool_connections=self.pool_size),
+                    )
+                )
+                self._stack = stack
+        return self._client
+
+    async def fetch(self, key: str) -> bytes:
+        client = self._client or await self.open()
+        start = time.perf_counter()
+        response = await client.get_object(Bucket=self.bucket, Key=key)
+        async with response["Body"] as body:
+            data = await body.read()
+        request_stage_histogram.observe(time.perf_counter() - start, stage="fetch")
+        return data
+
+    async def close(self) -> None:
+        if self._stack is not None:
+            await self._stack.aclose()
+            self._stack = None
+            self._client = None
+
+
+image_store = ImageStore()
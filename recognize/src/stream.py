@@ -0,0 +1,94 @@
+import asyncio
+import os
+import time
+from collections import Counter as CountOf, deque
+from statistics import median_low
+
+import numpy as np
+from PIL import Image
+
+from .metrics import Counter, Histogram
+from .schemas import Detection
+
+# mean absolute difference of 32x32 grayscale thumbnails, in grey levels,
+# below which a frame is treated as the same view as the last processed one
+CHANGE_THRESHOLD = float(os.getenv("RECOGNIZE_STREAM_CHANGE_THRESHOLD", "4"))
+# processed frames the stabilized counts are taken over
+STABILIZE_WINDOW = int(os.getenv("RECOGNIZE_STREAM_WINDOW", "5"))
+_THUMBNAIL_SIZE = (32, 32)
+
+stream_frames_counter = Counter(
+    "recognize_stream_frames_total",
+    "Streamed frames by outcome: processed, dropped (stale) or unchanged",
+)
+stream_latency_histogram = Histogram(
+    "recognize_stream_frame_latency_seconds",
+    "Time from receiving a streamed frame to sending its detections",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5),
+)
+
+
+def thumbnail(image: Image.Image) -> np.ndarray:
+    return np.asarray(
+        image.convert("L").resize(_THUMBNAIL_SIZE, Image.Resampling.BILINEAR),
+        dtype=np.int16,
+    )
+
+
+def frame_changed(
+    previous: np.ndarray | None,
+    current: np.ndarray,
+    threshold: float = CHANGE_THRESHOLD,
+) -> bool:
+    if previous is None:
+        return True
+    return float(np.abs(current - previous).mean()) >= threshold
+
+
+class CountStabilizer:
+    # per class median over the last frames, so a tool flickering in and
+    # out of a single frame does not change the reported composition
+    def __init__(self, window: int = STABILIZE_WINDOW) -> None:
+        self._frames: deque[CountOf[str]] = deque(maxlen=window)
+
+    def update(self, detections: list[Detection]) -> dict[str, int]:
+        self._frames.append(CountOf(detection.class_name for detection in detections))
+        names = set().union(*self._frames)
+        counts = {
+            name: median_low(frame[name] for frame in self._frames) for name in names
+        }
+        return {name: count for name, count in sorted(counts.items()) if count}
+
+
+class LatestFrame:
+    # single slot: a frame that arrives while the previous one still waits is
+    # stale and replaces it, so the stream never queues behind inference
+    def __init__(self) -> None:
+        self._frame: tuple[int, float, bytes] | None = None
+        self._available = asyncio.Event()
+        self.received = 0
+        self.dropped = 0
+        self.unchanged = 0
+
+    def put(self, data: bytes) -> None:
+        self.received += 1
+        if self._frame is not None:
+            self.dropped += 1
+            stream_frames_counter.inc(result="dropped")
+        self._frame = (self.received, time.perf_counter(), data)
+        self._available.set()
+
+    async def get(self) -> tuple[int, float, bytes]:
+        await self._available.wait()
+        self._available.clear()
+        assert self._frame is not None
+        frame, self._frame = self._frame, None
+        return frame
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "received": self.received,
+            "dropped": self.dropped,
+            "unchanged": self.unchanged,
+            "drop_rate": self.dropped / self.received if self.received else 0.0,
+        }
@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.process import BaseProcess
+
+WORKERS = os.getenv("RECOGNIZE_WORKERS", "1")
+THREADS_PER_WORKER = os.getenv("RECOGNIZE_THREADS_PER_WORKER", "auto")
+# YOLO on CPU gains little from more intra-op threads than this, extra cores
+# are better spent on additional consumers
+AUTO_THREADS_PER_WORKER = 4
+RESTART_BACKOFF_S = float(os.getenv("RECOGNIZE_RESTART_BACKOFF_S", "1"))
+MAX_RESTART_BACKOFF_S = 30.0
+# a worker that lived this long is considered healthy and resets its backoff
+STABLE_AFTER_S = 60.0
+HEALTH_PORT = int(os.getenv("RECOGNIZE_HEALTH_PORT", "8000"))
+
+
+def available_cpus() -> int:
+    return len(os.sched_getaffinity(0))
+
+
+def pool_size(setting: str = WORKERS) -> tuple[int, int]:
+    cpus = available_cpus()
+    if setting == "auto":
+        threads = (
+            min(AUTO_THREADS_PER_WORKER, cpus)
+            if THREADS_PER_WORKER == "auto"
+            else int(THREADS_PER_WORKER)
+        )
+        return max(1, cpus // threads), threads
+
+    workers = int(setting)
+    if workers < 1:
+        raise ValueError("Worker count must be a positive number or auto")
+    threads = (
+        max(1, cpus // workers)
+        if THREADS_PER_WORKER == "auto"
+        else int(THREADS_PER_WORKER)
+    )
+    return workers, threads
+
+
+def pin_threads(threads: int) -> None:
+    # must run before torch / onnxruntime are imported, they size their
+    # thread pools from these on first use
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    os.environ["RECOGNIZE_CPU_THREADS"] = str(threads)
+
+
+def run_consumer(threads: int, index: int = 0) -> None:
+    from .cpu_profile import pin_worker
+
+    pin_threads(threads)
+    pin_worker(index, threads)
+    # consumers probe on consecutive ports starting at the configured one
+    if HEALTH_PORT:
+        os.environ["RECOGNIZE_HEALTH_PORT"] = str(HEALTH_PORT + index)
+
+    import asyncio
+    from .startup import phase
+
+    with phase("imports"):
+        from .worker import app
+
+    asyncio.run(app.run())
+
+
+class Supervisor:
+    def __init__(self, workers: int, threads: int) -> None:
+        self.workers = workers
+        self.threads = threads
+        # spawn keeps children free of anything the parent imported
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: list[BaseProcess | None] = [None] * workers
+        self._started_at = [0.0] * workers
+        self._backoff = [RESTART_BACKOFF_S] * workers
+        self._restart_at = [0.0] * workers
+        self._stopping = False
+
+    def _start(self, index: int) -> None:
+        process = self._context.Process(
+            target=run_consumer,
+            args=(self.threads, index),
+            name=f"recognize-consumer-{index}",
+        )
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+        print(f"Started {process.name} (pid {process.pid}, {self.threads} threads)")
+
+    def _check(self, index: int) -> None:
+        process = self._processes[index]
+        now = time.monotonic()
+        if process is not None:
+            if process.is_alive():
+                return
+            lived = now - self._started_at[index]
+            if lived >= STABLE_AFTER_S:
+                self._backoff[index] = RESTART_BACKOFF_S
+            print(
+                f"{process.name} exited with code {process.exitcode} after "
+                f"{lived:.0f}s, restarting in {self._backoff[index]:.0f}s"
+            )
+            self._processes[index] = None
+            self._restart_at[index] = now + self._backoff[index]
+            self._backoff[index] = min(self._backoff[index] * 2, MAX_RESTART_BACKOFF_S)
+        if now >= self._restart_at[index]:
+            self._start(index)
+
+    def _stop(self, *_) -> None:
+        self._stopping = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        print(f"Supervising {self.workers} consumers with {self.threads} threads each")
+        for index in range(self.workers):
+            self._start(index)
+        while not self._stopping:
+            for index in range(self.workers):
+                self._check(index)
+            time.sleep(0.5)
+
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in self._processes:
+            if process is not None:
+                process.join()
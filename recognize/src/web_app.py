@@ -1,22 +1,67 @@
-import io
-from PIL import Image
+import asyncio
+import json
+import sys
+import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from functools import partial
+from fastapi import (
+    FastAPI,
+    File,
+    Form,
+    HTTPException,
+    Request,
+    Response,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+)
 from fastapi.middleware.cors import CORSMiddleware
-import torch
-from .model import model, load_model, recognize
-from .schemas import DetectResponse
+from .cache import result_cache, result_key
+from .codec import CONTENT_TYPE, encode_response
+from .executor import (
+    InferenceQueueFull,
+    inference_executor,
+    request_errors_counter,
+    request_stage_histogram,
+)
+from . import metrics
+from . import model as model_module
+from . import startup
+from .model import recognize, recognize_batch, rescale_detections
+from .quality import ImageRejected
+from .schemas import (
+    DetectResponse,
+    DetectStreamFrame,
+    KitHints,
+    kit_hints,
+    parse_kit_hints,
+)
+from .stream import (
+    CountStabilizer,
+    LatestFrame,
+    frame_changed,
+    stream_frames_counter,
+    stream_latency_histogram,
+    thumbnail,
+)
 
 
-@asynccontextmanager
-async def lifespan(app):
+async def _start() -> None:
     try:
-        load_model()
+        await startup.start()
     except Exception as e:
-        print(f"Warning: Could not load model at startup: {e}")
-        print("Model will be loaded on first request")
-        raise Exception() from e
+        print(f"Startup failed, liveness probe will report it: {e!r}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # the model loads in the background so /livez answers right away and
+    # /readyz turns healthy once the model is loaded and warm
+    startup_task = asyncio.create_task(_start())
     yield
+    startup.stop()
+    startup_task.cancel()
+    inference_executor.shutdown()
 
 
 app = FastAPI(title="YOLO Detection API", version="1.0.0", lifespan=lifespan)
@@ -29,44 +74,279 @@ app.add_middleware(
 )
 
 
+def _gpu_available() -> bool:
+    # torch is only imported by the torch backend
+    torch = sys.modules.get("torch")
+    return bool(torch and torch.cuda.is_available())
+
+
 @app.get("/")
 async def root():
     return {
         "message": "YOLO Detection API is running",
-        "model_loaded": model is not None,
-        "GPU available": torch.cuda.is_available(),
+        "model_loaded": model_module.active is not None,
+        "model": model_module.active.name if model_module.active else None,
+        "model_version": model_module.model_version,
+        "shadow_model": model_module.shadow.name if model_module.shadow else None,
+        "ready": startup.ready,
+        "startup_phases": startup.phases,
+        "GPU available": _gpu_available(),
+        "cache": result_cache.stats(),
     }
 
 
+@app.get("/livez")
+async def livez():
+    if not startup.live:
+        raise HTTPException(status_code=503, detail="Startup failed")
+    return {"live": True}
+
+
+@app.get("/readyz")
+async def readyz():
+    if not (startup.live and startup.ready):
+        raise HTTPException(status_code=503, detail="Model is not ready")
+    return {"ready": True}
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    # per process: with RECOGNIZE_HTTP_WORKERS > 1 a scrape sees one worker
+    return Response(metrics.render(), media_type=startup.METRICS_CONTENT_TYPE)
+
+
+async def _infer(image_data: bytes, hints: KitHints | None = None) -> DetectResponse:
+    async with inference_executor.admit():
+        image, scale = await inference_executor.decode(image_data)
+        await inference_executor.check_quality(image, scale)
+        start = time.perf_counter()
+        detections = rescale_detections(
+            await inference_executor.run(recognize, image, hints), scale
+        )
+        request_stage_histogram.observe(time.perf_counter() - start, stage="inference")
+    return DetectResponse(
+        detections=detections,
+        total_detections=len(detections),
+    )
+
+
 @app.post("/detect")
 async def detect_objects(
+    request: Request,
     file: UploadFile = File(...),
+    # JSON object of model class id -> quantity in the kit on the tray
+    expected_counts: str | None = Form(None),
+    # JSON list of model class ids that can be on the tray
+    allowed_classes: str | None = Form(None),
     # _: None = Depends(api_key_dependency),
 ):
-    global model
-    # for type checker
-    if model is None:
-        raise HTTPException(status_code=500, detail="Failed to load model")
+    if not startup.ready:
+        raise HTTPException(
+            status_code=503, detail="Model is not ready", headers={"Retry-After": "1"}
+        )
 
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
 
     try:
-        image_data = await file.read()
-        image = Image.open(io.BytesIO(image_data))
-        if image is None:
-            raise FileNotFoundError()
+        hints = parse_kit_hints(expected_counts, allowed_classes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid kit hints: {e}")
 
-        if image.mode != "RGB":
-            image = image.convert("RGB")
+    image_data = await file.read()
+    try:
+        response = await result_cache.get_or_compute(
+            result_key(image_data, hints), partial(_infer, image_data, hints)
+        )
+    except ImageRejected as e:
+        response = _failed(type(e).__name__, e.reason)
+    except InferenceQueueFull as e:
+        request_errors_counter.inc(type=type(e).__name__)
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "1"}
+        )
+    except Exception as e:
+        request_errors_counter.inc(type=type(e).__name__)
+        raise HTTPException(status_code=500, detail=f"Detection failed: {str(e)}")
+
+    if CONTENT_TYPE in request.headers.get("accept", ""):
+        return Response(encode_response(response), media_type=CONTENT_TYPE)
+    return response
+
+
+def _failed(error: str, reject_reason: str | None = None) -> DetectResponse:
+    return DetectResponse(
+        success=False,
+        detections=[],
+        total_detections=0,
+        error=error,
+        reject_reason=reject_reason,
+    )
 
-        detections = recognize(image)
 
-        response = DetectResponse(
-            detections=detections,
-            total_detections=len(detections),
+@app.post("/detect/batch")
+async def detect_objects_batch(
+    files: list[UploadFile] = File(...),
+    # JSON lists with an entry (or null) per file: expected_counts objects and
+    # allowed_classes lists, as in /detect
+    expected_counts: str | None = Form(None),
+    allowed_classes: str | None = Form(None),
+) -> list[DetectResponse]:
+    if not startup.ready:
+        raise HTTPException(
+            status_code=503, detail="Model is not ready", headers={"Retry-After": "1"}
         )
-        return response
+    if len(files) > inference_executor.capacity:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {inference_executor.capacity} images per batch",
+        )
+
+    try:
+        expected = (
+            json.loads(expected_counts) if expected_counts else [None] * len(files)
+        )
+        allowed = (
+            json.loads(allowed_classes) if allowed_classes else [None] * len(files)
+        )
+        if len(expected) != len(files) or len(allowed) != len(files):
+            raise ValueError("one entry per file is required")
+        hints = [kit_hints(*entry) for entry in zip(expected, allowed)]
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid kit hints: {e}")
+
+    # one result per file in upload order, a bad image only fails its own slot
+    results: list[DetectResponse | None] = [None] * len(files)
+    images_data: dict[int, bytes] = {}
+    for index, file in enumerate(files):
+        if not file.content_type or not file.content_type.startswith("image/"):
+            results[index] = _failed("File must be an image")
+        else:
+            images_data[index] = await file.read()
 
+    try:
+        async with inference_executor.admit(len(images_data)):
+            decoded = await asyncio.gather(
+                *[inference_executor.decode(data) for data in images_data.values()],
+                return_exceptions=True,
+            )
+            images = {}
+            for index, result in zip(images_data, decoded):
+                if isinstance(result, Exception):
+                    request_errors_counter.inc(type=type(result).__name__)
+                    results[index] = _failed(type(result).__name__)
+                else:
+                    images[index] = result
+            checks = await asyncio.gather(
+                *[
+                    inference_executor.check_quality(*image)
+                    for image in images.values()
+                ],
+                return_exceptions=True,
+            )
+            for index, check in zip(list(images), checks):
+                if isinstance(check, ImageRejected):
+                    results[index] = _failed(type(check).__name__, check.reason)
+                    del images[index]
+                elif isinstance(check, Exception):
+                    raise check
+            if images:
+                start = time.perf_counter()
+                batch = await inference_executor.run(
+                    recognize_batch,
+                    [image for image, _ in images.values()],
+                    [hints[index] for index in images],
+                )
+                request_stage_histogram.observe(
+                    time.perf_counter() - start, stage="inference"
+                )
+                for (index, (_, scale)), detections in zip(images.items(), batch):
+                    detections = rescale_detections(detections, scale)
+                    results[index] = DetectResponse(
+                        detections=detections, total_detections=len(detections)
+                    )
+    except InferenceQueueFull as e:
+        request_errors_counter.inc(type=type(e).__name__)
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "1"}
+        )
     except Exception as e:
+        request_errors_counter.inc(type=type(e).__name__)
         raise HTTPException(status_code=500, detail=f"Detection failed: {str(e)}")
+
+    return results
+
+
+async def _receive_frames(websocket: WebSocket, frames: LatestFrame) -> None:
+    while True:
+        frames.put(await websocket.receive_bytes())
+
+
+@app.websocket("/detect/stream")
+async def detect_stream(websocket: WebSocket):
+    # clients send JPEG frames as binary messages and get a JSON
+    # DetectStreamFrame back for every frame that was actually processed
+    await websocket.accept()
+    if not startup.ready:
+        await websocket.close(code=1013, reason="Model is not ready")
+        return
+
+    frames = LatestFrame()
+    stabilizer = CountStabilizer()
+    previous = None
+    receiver = asyncio.create_task(_receive_frames(websocket, frames))
+    try:
+        while True:
+            next_frame = asyncio.ensure_future(frames.get())
+            await asyncio.wait(
+                {next_frame, receiver}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not next_frame.done():
+                next_frame.cancel()
+                break
+            index, received_at, data = next_frame.result()
+
+            try:
+                async with inference_executor.admit():
+                    image, scale = await inference_executor.decode(data)
+                    current = thumbnail(image)
+                    if not frame_changed(previous, current):
+                        frames.unchanged += 1
+                        stream_frames_counter.inc(result="unchanged")
+                        continue
+                    detections = rescale_detections(
+                        await inference_executor.run(recognize, image), scale
+                    )
+            except InferenceQueueFull:
+                frames.dropped += 1
+                stream_frames_counter.inc(result="dropped")
+                continue
+            except Exception as e:
+                print(f"Stream frame {index} failed: {e!r}")
+                continue
+
+            previous = current
+            latency = time.perf_counter() - received_at
+            stream_frames_counter.inc(result="processed")
+            stream_latency_histogram.observe(latency)
+            reply = DetectStreamFrame(
+                frame=index,
+                detections=detections,
+                total_detections=len(detections),
+                stable_counts=stabilizer.update(detections),
+                latency_ms=latency * 1000,
+                **frames.stats(),
+            )
+            await websocket.send_text(reply.model_dump_json())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # retrieve why the receiver stopped, a client error would otherwise
+        # only surface as "Task exception was never retrieved"
+        receiver.cancel()
+        try:
+            await receiver
+        except (asyncio.CancelledError, WebSocketDisconnect):
+            pass
+        except Exception as e:
+            print(f"Stream receiver failed: {e!r}")
@@ -0,0 +1,170 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from src.backends import (
+    _NumpyPipelineBackend,
+    create_backend,
+    letterbox,
+    nms,
+    postprocess,
+)
+
+WEIGHTS_PATH = os.getenv("RECOGNIZE_WEIGHTS_PATH", "model.pt")
+PARITY_IMAGES = os.getenv("RECOGNIZE_PARITY_IMAGES", "tests/images")
+
+
+def _iou(a: np.ndarray, b: np.ndarray) -> float:
+    inter_w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    inter_h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+
+def _raw_prediction(rng: np.random.Generator, classes: int, anchors: int) -> np.ndarray:
+    centers = rng.uniform(50, 590, (anchors, 2))
+    sizes = rng.uniform(10, 120, (anchors, 2))
+    scores = rng.uniform(0, 1, (anchors, classes)) ** 4
+    return np.concatenate([centers, sizes, scores], axis=1).T.astype(np.float32)
+
+
+def test_nms_keeps_best_of_overlapping_boxes():
+    boxes = np.array(
+        [[0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30]], dtype=np.float32
+    )
+    scores = np.array([0.8, 0.9, 0.7], dtype=np.float32)
+    assert nms(boxes, scores, 0.5).tolist() == [1, 2]
+
+
+def test_letterbox_preserves_aspect_ratio():
+    image = Image.new("RGB", (1280, 640), (255, 0, 0))
+    canvas, ratio, (left, top) = letterbox(image, 640)
+    assert canvas.shape == (640, 640, 3)
+    assert ratio == 0.5
+    assert (left, top) == (0, 160)
+    assert canvas[0, 0].tolist() == [114, 114, 114]
+    assert canvas[320, 320].tolist() == [255, 0, 0]
+
+
+def test_postprocess_matches_ultralytics_nms():
+    torch = pytest.importorskip("torch")
+    nms_module = pytest.importorskip("ultralytics.utils.nms")
+
+    rng = np.random.default_rng(0)
+    prediction = _raw_prediction(rng, classes=11, anchors=2000)
+    expected = nms_module.non_max_suppression(
+        torch.from_numpy(prediction[None]), conf_thres=0.5, iou_thres=0.7
+    )[0].numpy()
+    # ultralytics clips while scaling boxes back to the image, not inside NMS
+    expected[:, :4] = expected[:, :4].clip(0, 640)
+    result = postprocess(prediction, 0.5, 1.0, (0, 0), (640, 640))
+
+    assert len(result) == len(expected)
+    np.testing.assert_allclose(result, expected, atol=1e-4)
+
+
+def test_postprocess_class_restriction_matches_ultralytics():
+    torch = pytest.importorskip("torch")
+    nms_module = pytest.importorskip("ultralytics.utils.nms")
+
+    rng = np.random.default_rng(1)
+    prediction = _raw_prediction(rng, classes=11, anchors=2000)
+    expected = nms_module.non_max_suppression(
+        torch.from_numpy(prediction[None]),
+        conf_thres=0.5,
+        iou_thres=0.7,
+        classes=[2, 7],
+    )[0].numpy()
+    expected[:, :4] = expected[:, :4].clip(0, 640)
+    result = postprocess(prediction, 0.5, 1.0, (0, 0), (640, 640), classes=[2, 7])
+
+    assert len(result) and set(result[:, 5].tolist()) <= {2, 7}
+    np.testing.assert_allclose(result, expected, atol=1e-4)
+    assert len(postprocess(prediction, 0.5, 1.0, (0, 0), (640, 640), classes=[])) == 0
+
+
+class _RedBoxBackend(_NumpyPipelineBackend):
+    # stands in for an exported model: finds the red box in each letterboxed
+    # input and reports it as class 0 at 0.9, a shifted weaker duplicate for
+    # NMS to drop, the same box as class 1 at 0.7 and a box below threshold
+    names = {0: "wrench", 1: "hammer"}
+
+    def __init__(self, batch_size: int | None = None) -> None:
+        self._batch_size = batch_size
+        self.batches = []
+
+    def _infer(self, batch: np.ndarray) -> np.ndarray:
+        self.batches.append(len(batch))
+        heads = np.zeros((len(batch), 4 + len(self.names), 4), dtype=np.float32)
+        for head, tensor in zip(heads, batch):
+            ys, xs = np.nonzero((tensor[0] > 0.5) & (tensor[1] < 0.2))
+            x1, y1, x2, y2 = xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+            cx, cy, w, h = (x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1
+            head[:4] = [
+                [cx, cx + 2, cx, 20],
+                [cy] * 3 + [20],
+                [w] * 3 + [10],
+                [h] * 3 + [10],
+            ]
+            head[4] = [0.9, 0.8, 0.0, 0.3]
+            head[5] = [0.1, 0.1, 0.7, 0.0]
+        return heads
+
+
+def test_numpy_pipeline_maps_detections_back_to_the_original_image():
+    # (image size, red box): downscaled, padded on the other axis, upscaled
+    cases = [
+        ((1280, 640), (200, 100, 600, 300)),
+        ((640, 960), (40, 500, 400, 900)),
+        ((320, 200), (10, 20, 110, 180)),
+    ]
+    images = []
+    for size, box in cases:
+        image = Image.new("RGB", size)
+        ImageDraw.Draw(image).rectangle(box, fill=(255, 0, 0))
+        images.append(image)
+    backend = _RedBoxBackend(batch_size=2)
+
+    results = backend.predict(images, conf=0.5)
+
+    # the last chunk of a statically shaped model is padded to a full batch
+    assert backend.batches == [2, 2]
+    for (_, (x1, y1, x2, y2)), result in zip(cases, results):
+        # a 1 px box edge lost to resampling is up to 2 px of the original
+        np.testing.assert_allclose(
+            result[:, :4], [[x1, y1, x2 + 1, y2 + 1]] * 2, atol=2.5
+        )
+        np.testing.assert_allclose(result[:, 4:], [[0.9, 0], [0.7, 1]])
+    assert len(backend.predict(images[:1], conf=0.5, classes=[1])[0]) == 1
+
+
+@pytest.mark.parametrize("backend", ["onnx", "openvino"])
+def test_backend_parity_with_torch(backend):
+    runtime = {"onnx": "onnxruntime", "openvino": "openvino"}[backend]
+    pytest.importorskip(runtime)
+    pytest.importorskip("ultralytics")
+    images_dir = Path(PARITY_IMAGES)
+    if not os.path.exists(WEIGHTS_PATH) or not images_dir.is_dir():
+        pytest.skip("parity check needs trained weights and sample images")
+    images = [
+        Image.open(path).convert("RGB")
+        for path in sorted(images_dir.iterdir())
+        if path.suffix.lower() in {".jpg", ".jpeg", ".png"}
+    ]
+
+    reference = create_backend("torch", WEIGHTS_PATH).predict(images, conf=0.5)
+    candidate = create_backend(backend, WEIGHTS_PATH).predict(images, conf=0.5)
+
+    for expected, result in zip(reference, candidate):
+        # resampling differs slightly between cv2 and PIL, so boxes near the
+        # threshold may flip; every confident torch box must still be found
+        for row in expected[expected[:, 4] >= 0.6]:
+            same_class = result[result[:, 5] == row[5]]
+            assert any(
+                _iou(row[:4], other[:4]) >= 0.9 and abs(row[4] - other[4]) <= 0.05
+                for other in same_class
+            ), f"{backend} missed {row.tolist()}"
@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+from PIL import Image
+
+from src import batching
+from src.batching import MicroBatcher
+from src.executor import DeadlineExceeded, InferenceExecutor, InferenceQueueFull
+
+
+def test_images_are_batched_up_to_max_size_in_order(monkeypatch):
+    batches = []
+
+    def recognize_batch(images, hints):
+        batches.append([image.width for image in images])
+        return [[image.width] for image in images]
+
+    monkeypatch.setattr(batching, "recognize_batch", recognize_batch)
+    images = [Image.new("RGB", (width, 8)) for width in range(1, 11)]
+
+    async def run():
+        executor = InferenceExecutor()
+        batcher = MicroBatcher(max_batch_size=4, linger_ms=50, executor=executor)
+        try:
+            return await asyncio.gather(*[batcher.submit(image) for image in images])
+        finally:
+            await batcher.stop()
+            executor.shutdown()
+
+    results = asyncio.run(run())
+
+    assert results == [[width] for width in range(1, 11)]
+    assert batches == [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]]
+
+
+def test_expired_requests_do_not_take_a_batch_slot(monkeypatch):
+    batches = []
+
+    def recognize_batch(images, hints):
+        batches.append(len(images))
+        return [[] for _ in images]
+
+    monkeypatch.setattr(batching, "recognize_batch", recognize_batch)
+    image = Image.new("RGB", (32, 32))
+
+    async def run():
+        executor = InferenceExecutor()
+        batcher = MicroBatcher(max_batch_size=4, linger_ms=50, executor=executor)
+        try:
+            return await asyncio.gather(
+                batcher.submit(image, deadline=time.time() + 60),
+                batcher.submit(image, deadline=time.time() - 1),
+                batcher.submit(image),
+                return_exceptions=True,
+            )
+        finally:
+            await batcher.stop()
+            executor.shutdown()
+
+    fresh, expired, unlimited = asyncio.run(run())
+
+    assert fresh == [] and unlimited == []
+    assert isinstance(expired, DeadlineExceeded) and expired.stage == "batch"
+    assert batches == [2]
+
+
+def test_interactive_lane_is_batched_first_and_alone(monkeypatch):
+    batches = []
+
+    def recognize_batch(images, hints):
+        batches.append([image.width for image in images])
+        return [[] for _ in images]
+
+    monkeypatch.setattr(batching, "recognize_batch", recognize_batch)
+    bulk, interactive = Image.new("RGB", (16, 16)), Image.new("RGB", (32, 32))
+
+    async def run():
+        executor = InferenceExecutor()
+        batcher = MicroBatcher(max_batch_size=4, linger_ms=50, executor=executor)
+        try:
+            await asyncio.gather(
+                *[batcher.submit(bulk, lane=batching.BULK) for _ in range(3)],
+                batcher.submit(interactive),
+            )
+        finally:
+            await batcher.stop()
+            executor.shutdown()
+
+    asyncio.run(run())
+
+    assert batches == [[32], [16, 16, 16]]
+
+
+def test_bulk_admissions_leave_room_for_interactive_ones():
+    async def run():
+        executor = InferenceExecutor(queue_size=4, bulk_queue_size=2)
+        try:
+            async with executor.admit(2, bulk=True):
+                try:
+                    async with executor.admit(bulk=True):
+                        pass
+                except InferenceQueueFull as e:
+                    bulk_full = e.capacity
+                async with executor.admit(2):
+                    full_released = await executor.wait_for_capacity(0.01)
+            return bulk_full, full_released, executor.admitted
+        finally:
+            executor.shutdown()
+
+    assert asyncio.run(run()) == (2, False, 0)
+
+
+def test_waiting_for_capacity_wakes_on_release():
+    async def run():
+        executor = InferenceExecutor(queue_size=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with executor.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(executor.wait_for_capacity(5))
+        await asyncio.sleep(0)
+        release.set()
+        await holder
+        try:
+            return await waiter
+        finally:
+            executor.shutdown()
+
+    assert asyncio.run(run()) is True
@@ -0,0 +1,26 @@
+from benchmarks.compare import compare
+
+
+def _report(p95_ms: float, images_per_s: float) -> dict:
+    return {
+        "stages": {"1mp_0obj": {"detections": 3, "forward_ms": 100.0}},
+        "end_to_end": [
+            {
+                "batch_size": 1,
+                "concurrency": 4,
+                "images_per_s": images_per_s,
+                "p95_ms": p95_ms,
+            }
+        ],
+    }
+
+
+def test_compare_flags_slower_latency_and_lower_throughput():
+    base = _report(p95_ms=200.0, images_per_s=10.0)
+
+    assert compare(base, _report(p95_ms=205.0, images_per_s=10.5), 0.1) == []
+    regressions = dict(compare(base, _report(p95_ms=250.0, images_per_s=8.0), 0.1))
+    assert set(regressions) == {
+        "end_to_end/batch1/conc4/p95_ms",
+        "end_to_end/batch1/conc4/images_per_s",
+    }
@@ -0,0 +1,32 @@
+import tarfile
+
+from src.bulk import iter_inputs
+
+
+def _write_images(directory):
+    (directory / "sub").mkdir()
+    for name in ("b.jpg", "a.png", "sub/c.JPG", "notes.txt"):
+        (directory / name).write_bytes(name.encode())
+
+
+def test_directory_and_tar_list_the_same_images(tmp_path):
+    source = tmp_path / "photos"
+    source.mkdir()
+    _write_images(source)
+    archive = tmp_path / "photos.tar.gz"
+    with tarfile.open(archive, "w:gz") as tar:
+        for name in ("a.png", "b.jpg", "notes.txt", "sub/c.JPG"):
+            tar.add(source / name, arcname=name)
+
+    from_directory = list(iter_inputs(str(source)))
+    from_tar = list(iter_inputs(str(archive)))
+
+    assert [name for name, _ in from_directory] == ["a.png", "b.jpg", "sub/c.JPG"]
+    assert from_directory[0][1] == str(source / "a.png")
+    assert from_tar == [(name, name.encode()) for name, _ in from_directory]
+
+
+def test_resume_skips_images_already_done(tmp_path):
+    _write_images(tmp_path)
+
+    assert [name for name, _ in iter_inputs(str(tmp_path), skip=2)] == ["sub/c.JPG"]
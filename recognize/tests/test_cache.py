@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from src.cache import ResultCache, cache_requests_counter
+from src.schemas import DetectResponse
+
+
+def _response(success: bool = True) -> DetectResponse:
+    return DetectResponse(success=success, detections=[], total_detections=0)
+
+
+def _counts() -> dict[str, float]:
+    return {
+        result: cache_requests_counter.value(result=result)
+        for result in ("hit", "miss", "coalesced")
+    }
+
+
+def test_concurrent_requests_share_one_inference():
+    calls = 0
+
+    async def compute() -> DetectResponse:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return _response()
+
+    async def run():
+        cache = ResultCache(max_entries=8, ttl_s=60)
+        before = _counts()
+        first = await asyncio.gather(
+            *[cache.get_or_compute("a", compute) for _ in range(3)]
+        )
+        second = await cache.get_or_compute("a", compute)
+        after = _counts()
+        return first, second, {key: after[key] - before[key] for key in after}
+
+    first, second, counts = asyncio.run(run())
+
+    assert calls == 1
+    assert all(response is first[0] for response in first + [second])
+    assert counts == {"hit": 1, "miss": 1, "coalesced": 2}
+
+
+def test_failures_reach_waiters_and_are_not_cached():
+    async def fail() -> DetectResponse:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def run():
+        cache = ResultCache(max_entries=8, ttl_s=60)
+        results = await asyncio.gather(
+            *[cache.get_or_compute("a", fail) for _ in range(2)], return_exceptions=True
+        )
+        await cache.get_or_compute("b", lambda: asyncio.sleep(0, _response(False)))
+        return cache, results
+
+    cache, results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+
+
+def test_lru_eviction_and_ttl(monkeypatch: pytest.MonkeyPatch):
+    now = 1000.0
+    monkeypatch.setattr("src.cache.time.monotonic", lambda: now)
+    cache = ResultCache(max_entries=2, ttl_s=10)
+    cache.put("a", _response())
+    cache.put("b", _response())
+    cache.get("a")
+    cache.put("c", _response())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+    now += 11
+    assert cache.get("a") is None
+    assert cache.get("c") is None
@@ -0,0 +1,32 @@
+import numpy as np
+
+from src.model import CASCADE_HIGH, CASCADE_LOW, THRESHOLD, escalation_reason
+
+
+def _detections(*rows: tuple[float, int]) -> np.ndarray:
+    return np.array(
+        [[0, 0, 10, 10, confidence, class_id] for confidence, class_id in rows],
+        dtype=np.float32,
+    ).reshape(-1, 6)
+
+
+def test_confident_detections_stay_on_small_model():
+    confident = max(CASCADE_HIGH, THRESHOLD) + 0.01
+    data = _detections((confident, 0), (confident, 0), (CASCADE_LOW / 2, 1))
+
+    assert escalation_reason(data) is None
+    assert escalation_reason(data, {0: 2, 3: 0}) is None
+
+
+def test_uncertain_detection_escalates():
+    data = _detections((0.99, 0), ((CASCADE_LOW + CASCADE_HIGH) / 2, 1))
+
+    assert escalation_reason(data) == "uncertain"
+
+
+def test_composition_mismatch_escalates():
+    data = _detections((0.99, 0), (0.99, 2))
+
+    assert escalation_reason(data, {0: 1}) == "composition"
+    assert escalation_reason(data, {0: 1, 2: 2}) == "composition"
+    assert escalation_reason(_detections(), {0: 1}) == "composition"
@@ -0,0 +1,73 @@
+import pytest
+
+from src.codec import MAGIC, decode_response, encode_response
+from src.schemas import Detection, DetectionBBox, DetectResponse
+
+
+def _detection(class_id: int, class_name: str, confidence: float) -> Detection:
+    return Detection(
+        class_id=class_id,
+        class_name=class_name,
+        confidence=confidence,
+        bbox=DetectionBBox(x1=1.5, y1=2.25, x2=100.0, y2=200.75),
+    )
+
+
+def test_roundtrip():
+    response = DetectResponse(
+        detections=[
+            _detection(0, "отвертка", 0.91),
+            _detection(3, "ключ", 0.75),
+            _detection(0, "отвертка", 0.8),
+        ],
+        total_detections=3,
+    )
+
+    data = encode_response(response)
+    decoded = decode_response(data)
+
+    assert data.startswith(MAGIC)
+    assert decoded.success and decoded.error is None
+    assert decoded.total_detections == 3
+    assert [d.class_name for d in decoded.detections] == [
+        "отвертка",
+        "ключ",
+        "отвертка",
+    ]
+    for original, restored in zip(response.detections, decoded.detections):
+        assert restored.class_id == original.class_id
+        assert restored.confidence == pytest.approx(original.confidence, abs=1e-6)
+        assert restored.bbox.model_dump() == original.bbox.model_dump()
+    assert len(data) < len(response.model_dump_json())
+
+
+def test_roundtrip_error():
+    response = DetectResponse(
+        success=False, detections=[], total_detections=0, error="RuntimeError"
+    )
+
+    decoded = decode_response(encode_response(response))
+
+    assert not decoded.success
+    assert decoded.detections == []
+    assert decoded.error == "RuntimeError"
+
+
+def test_rejects_foreign_payload():
+    with pytest.raises(ValueError):
+        decode_response(b'{"success": true, "detections": []}')
+
+
+def test_roundtrip_rejected_image():
+    response = DetectResponse(
+        success=False,
+        detections=[],
+        total_detections=0,
+        error="ImageRejected",
+        reject_reason="blurry",
+    )
+
+    decoded = decode_response(encode_response(response))
+
+    assert not decoded.success
+    assert (decoded.error, decoded.reject_reason) == ("ImageRejected", "blurry")
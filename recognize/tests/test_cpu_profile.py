@@ -0,0 +1,35 @@
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+
+from src.cpu_profile import apply_profile, format_cpus, parse_cpus
+
+
+def test_cpu_lists_round_trip():
+    assert parse_cpus("0-3, 8,10-11,2") == [0, 1, 2, 3, 8, 10, 11]
+    assert format_cpus([11, 0, 1, 2, 3, 8, 10]) == "0-3,8,10-11"
+
+
+def test_profile_fills_unset_settings_only(tmp_path, monkeypatch):
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps({"threads": 2, "imgsz": 480}))
+    monkeypatch.setenv("RECOGNIZE_IMGSZ", "640")
+
+    # apply_profile writes os.environ directly, restore it afterwards
+    with patch.dict(os.environ):
+        os.environ.pop("RECOGNIZE_THREADS_PER_WORKER", None)
+        apply_profile(str(path))
+
+        assert os.environ["RECOGNIZE_THREADS_PER_WORKER"] == "2"
+        # an explicitly set variable wins over the profile
+        assert os.environ["RECOGNIZE_IMGSZ"] == "640"
+
+
+def test_profile_rejects_unknown_settings(tmp_path):
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps({"thread": 2}))
+
+    with pytest.raises(ValueError, match="thread"):
+        apply_profile(str(path))
@@ -0,0 +1,46 @@
+import io
+
+from PIL import Image
+
+from src.executor import decode_image
+from src.model import rescale_detections
+from src.schemas import Detection, DetectionBBox
+
+
+def _encode(size: tuple[int, int], format: str) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (90, 120, 150)).save(buffer, format)
+    return buffer.getvalue()
+
+
+def test_jpeg_draft_keeps_long_side_above_target():
+    image, (scale_x, scale_y) = decode_image(_encode((4000, 3000), "JPEG"), target=640)
+
+    assert image.mode == "RGB"
+    assert 640 <= max(image.size) < 4000
+    assert image.width * scale_x == 4000
+    assert image.height * scale_y == 3000
+
+
+def test_full_decode_without_target_or_for_png():
+    for data, target in (
+        (_encode((1200, 900), "JPEG"), 0),
+        (_encode((1200, 900), "PNG"), 640),
+    ):
+        image, scale = decode_image(data, target=target)
+        assert image.size == (1200, 900)
+        assert scale == (1.0, 1.0)
+
+
+def test_rescale_detections_maps_back_to_original():
+    detection = Detection(
+        class_id=0,
+        class_name="wrench",
+        confidence=0.9,
+        bbox=DetectionBBox(x1=10, y1=20, x2=30, y2=40),
+    )
+
+    (rescaled,) = rescale_detections([detection], (4.0, 2.0))
+
+    assert rescaled.bbox == DetectionBBox(x1=40, y1=40, x2=120, y2=80)
+    assert rescaled.confidence == detection.confidence
@@ -0,0 +1,24 @@
+from src import metrics
+from src.metrics import Counter, Gauge, Histogram
+
+
+def test_render_prometheus_text(monkeypatch):
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    errors = Counter("test_errors_total", "Errors")
+    in_flight = Gauge("test_in_flight", "In flight", function=lambda: 3)
+    latency = Histogram("test_latency_seconds", "Latency", buckets=(0.1, 1))
+    errors.inc(type='Bad"Value')
+    latency.observe(0.05, stage="decode")
+    latency.observe(0.5, stage="decode")
+    latency.observe(5, stage="decode")
+
+    lines = metrics.render().splitlines()
+
+    assert "# TYPE test_errors_total counter" in lines
+    assert 'test_errors_total{type="Bad\\"Value"} 1.0' in lines
+    assert f"test_in_flight {in_flight.value()}" in lines
+    # buckets are cumulative and end with +Inf
+    assert 'test_latency_seconds_bucket{stage="decode",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{stage="decode",le="1"} 2' in lines
+    assert 'test_latency_seconds_bucket{stage="decode",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_count{stage="decode"} 3' in lines
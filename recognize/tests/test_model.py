@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from src import model
+from src.model import _to_detections
+from src.schemas import Detection, DetectionBBox
+
+
+def _loop_detections(boxes, names: dict[int, str]) -> list[Detection]:
+    # the per box loop the vectorized post-processing replaced
+    detections = []
+    for xyxy, conf, cls in zip(boxes.xyxy, boxes.conf, boxes.cls):
+        x1, y1, x2, y2 = xyxy
+        confidence = float(conf)
+        if confidence >= model.THRESHOLD:
+            detections.append(
+                Detection(
+                    class_id=int(cls),
+                    class_name=names[int(cls)],
+                    confidence=confidence,
+                    bbox=DetectionBBox(x1=x1, y1=y1, x2=x2, y2=y2),
+                )
+            )
+    return detections
+
+
+def test_vectorized_detections_match_the_per_box_loop(monkeypatch):
+    monkeypatch.setattr(model, "THRESHOLD", 0.7)
+    names = {0: "отвертка", 1: "ключ", 2: "пассатижи"}
+    boxes = SimpleNamespace(
+        xyxy=np.array(
+            [[10, 20, 110, 220], [5.5, 6.5, 50, 60], [0, 0, 640, 480], [1, 2, 3, 4]],
+            dtype=np.float32,
+        ),
+        # float32 0.7 is just below a 0.7 threshold, the loop dropped it
+        conf=np.array([0.91, 0.42, 0.75, 0.7], dtype=np.float32),
+        cls=np.array([2, 0, 1, 0], dtype=np.float32),
+    )
+    data = np.column_stack([boxes.xyxy, boxes.conf, boxes.cls])
+
+    detections = _to_detections(data, np.array(list(names.values()), dtype=object))
+
+    assert detections == _loop_detections(boxes, names)
+    assert [(d.class_id, d.class_name) for d in detections] == [
+        (2, "пассатижи"),
+        (1, "ключ"),
+    ]
+    assert _to_detections(data[:0], np.array([], dtype=object)) == []
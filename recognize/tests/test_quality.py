@@ -0,0 +1,27 @@
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from src.quality import assess
+
+
+def _tray(size=(800, 600)) -> Image.Image:
+    rng = np.random.default_rng(0)
+    image = Image.fromarray(rng.integers(90, 160, (*size[::-1], 3), dtype=np.uint8))
+    draw = ImageDraw.Draw(image)
+    for i in range(12):
+        x, y = 40 + (i % 4) * 180, 60 + (i // 4) * 170
+        draw.rectangle((x, y, x + 120, y + 30), fill=(20 * i, 200, 40))
+    return image
+
+
+def test_quality_reasons():
+    sharp = _tray()
+
+    assert assess(sharp).reason is None
+    assert assess(sharp.filter(ImageFilter.GaussianBlur(8))).reason == "blurry"
+    assert assess(Image.new("RGB", (800, 600), (5, 5, 5))).reason == "underexposed"
+    assert assess(Image.new("RGB", (800, 600), "white")).reason == "overexposed"
+    # decoded downscaled, the original photo was large enough
+    small = sharp.resize((200, 150))
+    assert assess(small).reason == "low_resolution"
+    assert assess(small, scale=(4.0, 4.0)).reason is None
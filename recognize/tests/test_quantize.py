@@ -0,0 +1,91 @@
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from src import quantize
+from src.matching import match_detections
+from src.quantize import evaluate
+
+SCREWDRIVER = [10, 10, 60, 60, 0.9, 0]
+WRENCH = [100, 100, 200, 150, 0.8, 1]
+
+
+def _boxes(*rows: list[float]) -> np.ndarray:
+    return np.array(rows, dtype=np.float32).reshape(-1, 6)
+
+
+class _FakeBackend:
+    names = {0: "отвертка", 1: "ключ"}
+    path = "model.onnx"
+
+    # outputs per image, or one output for every image
+    def __init__(self, outputs, images: list[Image.Image] | None = None):
+        self._outputs = outputs
+        if images is not None:
+            self._outputs = {id(image): out for image, out in zip(images, outputs)}
+
+    def predict(self, images, conf, classes=None):
+        if isinstance(self._outputs, dict):
+            return [self._outputs[id(image)] for image in images]
+        return [self._outputs for _ in images]
+
+
+def test_match_detections():
+    reference = _boxes(SCREWDRIVER, WRENCH)
+
+    same = match_detections(reference, _boxes([12, 11, 61, 59, 0.85, 0], WRENCH))
+    assert same == {0: {"tp": 1, "fp": 0, "fn": 0}, 1: {"tp": 1, "fp": 0, "fn": 0}}
+
+    # the right box with the wrong class is a miss of one and a false alarm
+    swapped = match_detections(reference[:1], _boxes([10, 10, 60, 60, 0.9, 1]))
+    assert swapped == {1: {"tp": 0, "fp": 1, "fn": 0}, 0: {"tp": 0, "fp": 0, "fn": 1}}
+
+    shifted = match_detections(reference[:1], _boxes([40, 40, 90, 90, 0.9, 0]))
+    assert shifted == {0: {"tp": 0, "fp": 1, "fn": 1}}
+
+
+def test_gate_fails_a_class_that_regressed():
+    images = [Image.new("RGB", (32, 32)) for _ in range(4)]
+    fp32 = [_boxes(SCREWDRIVER, WRENCH) for _ in images]
+    # int8 loses one wrench out of four, screwdrivers are unchanged
+    int8 = [_boxes(SCREWDRIVER, WRENCH) for _ in images[:3]] + [_boxes(SCREWDRIVER)]
+
+    report = evaluate(
+        _FakeBackend(fp32, images), _FakeBackend(int8, images), images, 0.02
+    )
+
+    assert not report["passed"]
+    assert report["classes"]["отвертка"]["passed"]
+    assert report["classes"]["ключ"]["recall"] == 0.75
+    assert not report["classes"]["ключ"]["passed"]
+    tolerant = evaluate(
+        _FakeBackend(fp32, images), _FakeBackend(int8, images), images, 0.25
+    )
+    assert tolerant["passed"]
+
+
+def test_failed_gate_does_not_activate_the_candidate(tmp_path, monkeypatch):
+    weights = str(tmp_path / "model.pt")
+    (tmp_path / "photos").mkdir()
+    Image.new("RGB", (32, 32)).save(tmp_path / "photos" / "tray.jpg")
+    reference = _boxes(SCREWDRIVER)
+
+    def fake_quantize(fp32_path, output_path, calibration_paths):
+        with open(output_path, "wb") as f:
+            f.write(b"int8")
+
+    monkeypatch.setattr(quantize, "quantize", fake_quantize)
+    monkeypatch.setattr(quantize, "create_backend", lambda *a: _FakeBackend(reference))
+    # the int8 candidate finds nothing
+    monkeypatch.setattr(quantize, "OnnxBackend", lambda p: _FakeBackend(reference[:0]))
+    args = ["--calibration-dir", str(tmp_path / "photos"), "--weights", weights]
+
+    assert quantize.main(args) == 1
+    active = Path(quantize.int8_path(weights))
+    assert not active.exists()
+    assert active.with_suffix(".candidate.onnx").exists()
+
+    monkeypatch.setattr(quantize, "OnnxBackend", lambda p: _FakeBackend(reference))
+    assert quantize.main(args) == 0
+    assert active.read_bytes() == b"int8"
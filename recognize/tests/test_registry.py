@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+import pytest
+
+from src.registry import ModelRegistry
+from src.shadow import compare
+
+
+def _registry(tmp_path, config: dict) -> ModelRegistry:
+    path = tmp_path / "registry.json"
+    path.write_text(json.dumps(config))
+    return ModelRegistry(str(path), "model.pt", None, "torch", "fp32")
+
+
+def test_unknown_active_model_is_reported_once(tmp_path):
+    registry = _registry(tmp_path, {"models": {"a": "a.pt"}, "active": "b"})
+
+    with pytest.raises(ValueError, match="not registered"):
+        registry.refresh()
+    # unchanged file, nothing to retry
+    assert registry.refresh() is None
+
+
+def test_shadow_sample_must_be_a_fraction(tmp_path):
+    registry = _registry(
+        tmp_path,
+        {"models": {"a": "a.pt"}, "active": "a", "shadow": "a", "shadow_sample": 5},
+    )
+
+    with pytest.raises(ValueError, match="shadow_sample"):
+        registry.refresh()
+
+
+def test_shadow_compare_counts_and_boxes():
+    active = np.array(
+        [[0, 0, 10, 10, 0.9, 1], [20, 20, 30, 30, 0.9, 1]], dtype=np.float32
+    )
+    same = active + np.array([1, 1, 1, 1, 0, 0], dtype=np.float32)
+    moved = np.array(
+        [[0, 0, 10, 10, 0.9, 1], [60, 60, 70, 70, 0.9, 1]], dtype=np.float32
+    )
+
+    assert compare(active, same) == (True, {"tp": 2, "fp": 0, "fn": 0})
+    # same counts, but one box is elsewhere
+    assert compare(active, moved) == (True, {"tp": 1, "fp": 1, "fn": 1})
+    assert compare(active, active[:1]) == (False, {"tp": 1, "fp": 0, "fn": 1})
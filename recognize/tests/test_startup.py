@@ -0,0 +1,22 @@
+from src import startup
+
+
+def test_parse_sizes():
+    assert startup.parse_sizes("640") == [(640, 640)]
+    assert startup.parse_sizes("640, 4032x3024,") == [(640, 640), (4032, 3024)]
+    assert startup.parse_sizes("") == []
+
+
+def test_probes_follow_startup_state(monkeypatch):
+    monkeypatch.setattr(startup, "live", True)
+    monkeypatch.setattr(startup, "ready", False)
+    assert startup._probe("/livez") == 200
+    assert startup._probe("/readyz") == 503
+
+    monkeypatch.setattr(startup, "ready", True)
+    assert startup._probe("/readyz") == 200
+
+    monkeypatch.setattr(startup, "live", False)
+    assert startup._probe("/livez") == 503
+    assert startup._probe("/readyz") == 503
+    assert startup._probe("/") == 404
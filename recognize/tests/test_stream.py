@@ -0,0 +1,53 @@
+import asyncio
+
+import numpy as np
+from PIL import Image
+
+from src.schemas import Detection, DetectionBBox
+from src.stream import CountStabilizer, LatestFrame, frame_changed, thumbnail
+
+
+def _detections(*names: str) -> list[Detection]:
+    bbox = DetectionBBox(x1=0, y1=0, x2=1, y2=1)
+    return [
+        Detection(class_id=0, class_name=name, confidence=0.9, bbox=bbox)
+        for name in names
+    ]
+
+
+def test_frame_changed():
+    dark = thumbnail(Image.new("RGB", (640, 480), (50, 50, 50)))
+    noisy = np.clip(dark + 1, 0, 255)
+    bright = thumbnail(Image.new("RGB", (640, 480), (200, 200, 200)))
+
+    assert frame_changed(None, dark)
+    assert not frame_changed(dark, noisy)
+    assert frame_changed(dark, bright)
+
+
+def test_stabilizer_ignores_single_frame_flicker():
+    stabilizer = CountStabilizer(window=3)
+    stabilizer.update(_detections("wrench", "hammer"))
+    stabilizer.update(_detections("wrench", "hammer"))
+
+    assert stabilizer.update(_detections("wrench")) == {"hammer": 1, "wrench": 1}
+    assert stabilizer.update(_detections("wrench", "wrench")) == {"wrench": 1}
+
+
+def test_latest_frame_drops_stale_frames():
+    async def run():
+        frames = LatestFrame()
+        for data in (b"1", b"2", b"3"):
+            frames.put(data)
+        index, _, data = await frames.get()
+        return frames, index, data
+
+    frames, index, data = asyncio.run(run())
+
+    assert (index, data) == (3, b"3")
+    assert frames.stats() == {
+        "received": 3,
+        "dropped": 2,
+        "unchanged": 0,
+        "drop_rate": 2 / 3,
+    }
@@ -0,0 +1,57 @@
+import pytest
+
+from src import supervisor
+from src.supervisor import Supervisor, pool_size
+
+
+def test_pool_size(monkeypatch):
+    monkeypatch.setattr(supervisor, "available_cpus", lambda: 16)
+    assert pool_size("auto") == (4, 4)
+    assert pool_size("3") == (3, 5)
+    # more consumers than cores still get a thread each
+    assert pool_size("32") == (32, 1)
+    monkeypatch.setattr(supervisor, "THREADS_PER_WORKER", "2")
+    assert pool_size("auto") == (8, 2)
+    assert pool_size("3") == (3, 2)
+
+    monkeypatch.setattr(supervisor, "THREADS_PER_WORKER", "auto")
+    monkeypatch.setattr(supervisor, "available_cpus", lambda: 2)
+    assert pool_size("auto") == (1, 2)
+    with pytest.raises(ValueError):
+        pool_size("0")
+
+
+class _FakeProcess:
+    name = "recognize-consumer-0"
+    exitcode = 1
+    alive = True
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+
+def test_restart_backoff_grows_and_resets_after_a_stable_run(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(supervisor.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(supervisor, "RESTART_BACKOFF_S", 1.0)
+    pool = Supervisor(workers=1, threads=1)
+
+    def start(index):
+        pool._processes[index] = _FakeProcess()
+        pool._started_at[index] = now[0]
+
+    monkeypatch.setattr(pool, "_start", start)
+
+    def restart_delay(lived: float) -> float:
+        now[0] += lived
+        pool._processes[0].alive = False
+        crashed_at = now[0]
+        pool._check(0)
+        while pool._processes[0] is None:
+            now[0] += 0.5
+            pool._check(0)
+        return now[0] - crashed_at
+
+    start(0)
+    assert [restart_delay(1) for _ in range(7)] == [1, 2, 4, 8, 16, 30, 30]
+    assert restart_delay(supervisor.STABLE_AFTER_S) == 1
@@ -0,0 +1,94 @@
+import asyncio
+import io
+import time
+
+import pytest
+from faststream.exceptions import NackMessage
+from faststream.rabbit import TestRabbitBroker
+from PIL import Image
+
+from src import worker
+from src.batching import INTERACTIVE
+from src.codec import REPLY_FORMAT, decode_response
+from src.executor import InferenceExecutor, expired_requests_counter
+from src.schemas import Detection, DetectionBBox, DetectResponse, KitHints
+
+
+def test_full_worker_holds_the_message_before_requeueing(monkeypatch):
+    executor = InferenceExecutor(queue_size=0)
+    monkeypatch.setattr(worker, "inference_executor", executor)
+    monkeypatch.setattr(worker, "load_model", lambda: None)
+    monkeypatch.setattr(worker, "REQUEUE_DELAY_MS", 50)
+
+    start = time.monotonic()
+    with pytest.raises(NackMessage):
+        asyncio.run(worker._detect(b"image"))
+    executor.shutdown()
+
+    assert time.monotonic() - start >= 0.05
+
+
+def test_message_past_its_deadline_is_dropped_before_decoding(monkeypatch):
+    def not_called(*args, **kwargs):
+        raise AssertionError("an expired message must not be processed")
+
+    monkeypatch.setattr(worker, "load_model", not_called)
+    monkeypatch.setattr(worker.inference_executor, "decode", not_called)
+    monkeypatch.setattr(worker.batcher, "submit", not_called)
+    dropped = expired_requests_counter.value(stage="queue")
+
+    async def run():
+        async with TestRabbitBroker(worker.broker) as br:
+            return await br.request(
+                b"image",
+                routing_key=worker.detect_binary_queue.name,
+                exchange=worker.detect_exchange,
+                headers={"x-deadline": str(time.time() - 1)},
+            )
+
+    reply = DetectResponse.model_validate_json(asyncio.run(run()).body)
+
+    assert reply.success is False and reply.error == "DeadlineExceeded"
+    assert expired_requests_counter.value(stage="queue") == dropped + 1
+
+
+def test_binary_message_round_trip(monkeypatch):
+    submitted = []
+    detection = Detection(
+        class_id=3,
+        class_name="wrench",
+        # exact in float32, the compact reply format's precision
+        confidence=0.75,
+        bbox=DetectionBBox(x1=1, y1=2, x2=30, y2=40),
+    )
+
+    async def submit(image, hints, deadline, lane):
+        submitted.append((image.size, hints, lane))
+        return [detection]
+
+    async def check_quality(image, scale):
+        pass
+
+    monkeypatch.setattr(worker, "load_model", lambda: None)
+    monkeypatch.setattr(worker.inference_executor, "check_quality", check_quality)
+    monkeypatch.setattr(worker.batcher, "submit", submit)
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (10, 20, 30)).save(buffer, format="PNG")
+
+    async def run():
+        async with TestRabbitBroker(worker.broker) as br:
+            return await br.request(
+                buffer.getvalue(),
+                routing_key=worker.detect_binary_queue.name,
+                exchange=worker.detect_exchange,
+                headers={
+                    "x-request-id": "round-trip",
+                    "x-expected-counts": '{"3": 1}',
+                    "x-reply-format": REPLY_FORMAT,
+                },
+            )
+
+    reply = asyncio.run(run())
+
+    assert submitted == [((64, 48), KitHints(expected_counts={3: 1}), INTERACTIVE)]
+    assert decode_response(reply.body).detections == [detection]